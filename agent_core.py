@@ -1,19 +1,20 @@
 import asyncio
-import json
 import traceback
 import os
-from typing import List, Optional, Union, Dict, Any
+import uuid
+from typing import FrozenSet, List, Optional, Union, Dict, Any
 from pydantic import Field, model_validator, BaseModel, PrivateAttr
 from loguru import logger
+import orjson
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
 from rich.live import Live
 
 from config import settings
-from schema import Message, AgentState, ToolChoice, ToolCall, Role, Function, Memory
+from schema import Message, AgentState, ToolChoice, ToolCall, Role, Function, Memory, sanitize_content
 from base_tool import BaseTool, ToolResult, ToolCollection, ToolFailure
-from llm import LLM
+from llm import LLM, get_shared_llm
 
 # Prompts (New V2 with CoT)
 from prompts import (
@@ -49,7 +50,7 @@ class BrowserContextHelper:
                 self._current_base64_image = result.base64_image
             else:
                 self._current_base64_image = None
-            return json.loads(result.output)
+            return orjson.loads(result.output)
         except Exception as e:
             logger.debug(f"Failed to get browser state: {str(e)}")
             return None
@@ -100,17 +101,22 @@ class ToolCallAgent(BaseModel):
     system_prompt: str = Field(default_factory=lambda: get_system_prompt(settings.MAX_STEPS))
     next_step_prompt: str = NEXT_STEP_PROMPT
 
-    llm: LLM = Field(default_factory=LLM)
+    llm: LLM = Field(default_factory=get_shared_llm)
     memory: Memory = Field(default_factory=Memory)
     state: AgentState = AgentState.IDLE
 
     available_tools: ToolCollection = Field(default_factory=lambda: ToolCollection(Terminate()))
     tool_choices: ToolChoice = ToolChoice.AUTO
     
-    special_tool_names: List[str] = Field(default_factory=lambda: ["terminate"])
+    special_tool_names: FrozenSet[str] = frozenset({"terminate"})
     _console: Console = PrivateAttr(default_factory=Console)
     _is_complex_task: bool = PrivateAttr(default=False)
     _last_tool_result: str = PrivateAttr(default="")
+    _prefetched: Dict[str, asyncio.Task] = PrivateAttr(default_factory=dict)
+    # Response cache namespace; unlike id(), never reused by a later session
+    _session_id: str = PrivateAttr(default_factory=lambda: uuid.uuid4().hex)
+    # Task text for the semantic cache, set only while the next turn is a fresh conversation's first
+    _semantic_query: Optional[str] = PrivateAttr(default=None)
     final_answer: Optional[str] = None
 
     max_steps: int = 30
@@ -121,6 +127,9 @@ class ToolCallAgent(BaseModel):
 
     def initialize(self, user_input: str = ""):
         if user_input:
+            # Paraphrased tasks can share a direct answer only when nothing else is in context
+            fresh = all(m.role is Role.SYSTEM for m in self.memory.messages)
+            self._semantic_query = user_input if fresh else None
             self.memory.add_message(Message.user_message(user_input))
             self._is_complex_task = is_complex_task(user_input)
 
@@ -142,30 +151,17 @@ class ToolCallAgent(BaseModel):
              self.memory.add_message(Message.user_message(effective_prompt))
 
         try:
-            response = await self.llm.ask_tool(
-                messages=self.memory.to_dict_list(),
-                tools=self.available_tools.to_params(),
-                tool_choice=self.tool_choices,
-            )
+            streamed = await self._stream_turn()
         except Exception as e:
+            self._cancel_prefetched()
             logger.success(f"❌ [bold red]LLM failure:[/bold red] {str(e)[:100]}")
             return False
 
-        if not response.choices:
+        if streamed is None:
             return False
 
-        assistant_msg_raw = response.choices[0].message
-        content = assistant_msg_raw.content or ""
-        
-        # Parse tool calls using the new schema
-        tool_calls = []
-        if assistant_msg_raw.tool_calls:
-            for tc in assistant_msg_raw.tool_calls:
-                tool_calls.append(ToolCall(
-                    id=tc.id,
-                    type=tc.type,
-                    function=Function(name=tc.function.name, arguments=tc.function.arguments)
-                ))
+        raw_content, tool_calls = streamed
+        content = sanitize_content(raw_content)
 
         # Add assistant message to memory
         assistant_msg = Message.assistant_message(content=content, tool_calls=tool_calls if tool_calls else None)
@@ -182,18 +178,112 @@ class ToolCallAgent(BaseModel):
         
         return False
 
+    async def _stream_turn(self) -> Optional[tuple]:
+        """Stream one LLM turn. Returns (content, tool_calls), or None if nothing came back.
+
+        Tool-call arguments arrive as JSON fragments; as soon as a parallel-safe call's
+        arguments parse, it is started in the background so it overlaps the rest of the stream.
+        """
+        content_parts: List[str] = []
+        pending: Dict[int, dict] = {}
+        last_index: Optional[int] = None
+        # Later turns depend on tool results, and the step prompt they end with is the same for every task
+        semantic_query, self._semantic_query = self._semantic_query, None
+
+        async for chunk in self.llm.ask_tool_stream(
+            messages=self.memory.messages,
+            tools=self.available_tools.to_params(),
+            tool_choice=self.tool_choices,
+            # One namespace per conversation: a repeated prompt gets a fresh sample, not a replay
+            namespace=self._session_id,
+            semantic_query=semantic_query,
+        ):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+            for tc_delta in delta.tool_calls or []:
+                index = tc_delta.index
+                if index is None:
+                    # Without an index a fragment continues the open call; only a new call id starts another
+                    open_id = pending[last_index]["id"] if last_index is not None else ""
+                    starts_new = last_index is None or (tc_delta.id and open_id and tc_delta.id != open_id)
+                    index = max(pending, default=-1) + 1 if starts_new else last_index
+                last_index = index
+                call = pending.setdefault(index, {"id": "", "name": "", "args": [], "prefetched": None})
+                if tc_delta.id:
+                    call["id"] = tc_delta.id
+                if tc_delta.function and tc_delta.function.name:
+                    call["name"] = tc_delta.function.name
+                if tc_delta.function and tc_delta.function.arguments:
+                    call["args"].append(tc_delta.function.arguments)
+                    self._maybe_prefetch(pending, index)
+
+        if not content_parts and not pending:
+            return None
+
+        tool_calls = []
+        for index in sorted(pending):
+            call = pending[index]
+            tool_call = ToolCall(id=call["id"], function=Function(name=call["name"], arguments="".join(call["args"])))
+            # A prefetch is only valid if nothing was appended after its arguments closed
+            if call["prefetched"] is not None and call["prefetched"] != tool_call.function.arguments:
+                self._prefetched.pop(tool_call.id).cancel()
+            tool_calls.append(tool_call)
+        return "".join(content_parts), tool_calls
+
+    def _maybe_prefetch(self, pending: Dict[int, dict], index: int):
+        call = pending[index]
+        if call["prefetched"] is not None or not call["id"] or not call["args"][-1].rstrip().endswith("}"):
+            return
+        arguments = "".join(call["args"])
+        try:
+            orjson.loads(arguments)
+        except ValueError:
+            return
+
+        # Never overtake an earlier stateful call from the same turn
+        for i in sorted(pending):
+            if i > index:
+                break
+            earlier = pending[i]
+            if not self._is_parallel_safe(ToolCall(id=earlier["id"], function=Function(name=earlier["name"], arguments=""))):
+                return
+
+        tool_call = ToolCall(id=call["id"], function=Function(name=call["name"], arguments=arguments))
+        call["prefetched"] = arguments
+        self._prefetched[tool_call.id] = asyncio.create_task(self.execute_tool(tool_call))
+
+    def _cancel_prefetched(self):
+        for task in self._prefetched.values():
+            task.cancel()
+        self._prefetched.clear()
+
     async def act(self) -> str:
         """Execute tool calls from the last assistant message."""
         last_msg = self.memory.messages[-1]
         if not last_msg.tool_calls:
             return "No actions to take."
 
-        results = []
+        # Independent calls run concurrently; stateful tools act as barriers so
+        # their order relative to the other calls is preserved.
+        tool_results = []
+        batch: List[ToolCall] = []
         for tc in last_msg.tool_calls:
-            result = await self.execute_tool(tc)
-            
+            if self._is_parallel_safe(tc):
+                batch.append(tc)
+                continue
+            tool_results.extend(await self._execute_batch(batch))
+            batch = []
+            tool_results.append(await self._run_tool_call(tc))
+        tool_results.extend(await self._execute_batch(batch))
+
+        results = []
+        for tc, result in zip(last_msg.tool_calls, tool_results):
             # UI: Results (Snippet)
-            output_str = str(result.output if hasattr(result, "output") else result)
+            # ToolResult.__str__ renders failures as "Error: ...", so the model sees why a tool failed
+            output_str = sanitize_content(str(result))
             if output_str and len(output_str) > 2:
                 snippet = output_str[:120].replace("\n", " ").strip() + ("..." if len(output_str) > 120 else "")
                 self._console.print(f" [green]> Result:[/green] [dim]{snippet}[/dim]")
@@ -201,29 +291,48 @@ class ToolCallAgent(BaseModel):
                 self._console.print(f" [green]> Result:[/green] [dim]Done.[/dim]")
 
             # Add tool result to memory
+            # Inherit image if result has it
             tool_msg = Message.tool_message(
                 content=output_str,
                 name=tc.function.name,
-                tool_call_id=tc.id
+                tool_call_id=tc.id,
+                base64_image=result.base64_image if isinstance(result, ToolResult) else None,
             )
-            # Inherit image if result has it
-            if isinstance(result, ToolResult) and result.base64_image:
-                 tool_msg.base64_image = result.base64_image
-            
             self.memory.add_message(tool_msg)
             results.append(f"Tool {tc.function.name} results added.")
         
         return "\n".join(results)
 
+    def _is_parallel_safe(self, tool_call: ToolCall) -> bool:
+        name = tool_call.function.name
+        if name.lower() in self.special_tool_names:
+            return False
+        tool = self.available_tools.get_tool(name)
+        return tool is not None and tool.parallel_safe
+
+    async def _execute_batch(self, batch: List[ToolCall]) -> List[Any]:
+        """Run parallel-safe tool calls concurrently, keeping results in call order."""
+        if len(batch) <= 1:
+            return [await self._run_tool_call(tc) for tc in batch]
+        results = await asyncio.gather(*(self._run_tool_call(tc) for tc in batch), return_exceptions=True)
+        return [ToolResult(error=str(r)) if isinstance(r, Exception) else r for r in results]
+
+    async def _run_tool_call(self, tool_call: ToolCall) -> Any:
+        """Await the call if it was already started while streaming, otherwise execute it now."""
+        task = self._prefetched.pop(tool_call.id, None)
+        if task is not None:
+            return await task
+        return await self.execute_tool(tool_call)
+
     async def execute_tool(self, tool_call: ToolCall) -> Any:
         name = tool_call.function.name
         try:
-            args = json.loads(tool_call.function.arguments)
+            args = orjson.loads(tool_call.function.arguments)
         except:
             return f"Error: Invalid arguments for {name}"
 
         # Terminate check (preserved from original logic)
-        if name.lower() == "terminate":
+        if name.lower() in self.special_tool_names:
             self.state = AgentState.FINISHED
             res = await self.available_tools.execute(name=name, tool_input=args)
             self.final_answer = res.output if isinstance(res, ToolResult) else str(res)
@@ -1,12 +1,23 @@
+import inspect
+import json
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Any, Optional, Dict, List
+from typing import Any, AsyncIterator, Optional, Dict, List
 from abc import ABC, abstractmethod
 
-class ToolResult(BaseModel):
-    output: Any = Field(default=None)
-    error: Optional[str] = Field(default=None)
-    base64_image: Optional[str] = Field(default=None)
-    system: Optional[str] = Field(default=None)
+from config import settings
+from disk_cache import DiskCache
+
+# Plain slotted container: built once per tool call and never validated, so it
+# skips Pydantic's __init__ and per-instance __dict__.
+@dataclass(slots=True, kw_only=True)
+class ToolResult:
+    output: Any = None
+    error: Optional[str] = None
+    base64_image: Optional[str] = None
+    system: Optional[str] = None
 
     def __str__(self):
         return f"Error: {self.error}" if self.error else str(self.output)
@@ -19,6 +30,28 @@ class CLIResult(ToolResult):
     """A ToolResult that can be rendered as a CLI output."""
     pass
 
+async def collect_capped(chunks: AsyncIterator[str], head: int = 4000, tail: int = 4000) -> str:
+    """Drain a stream of text chunks, keeping only the first `head` and last `tail` characters."""
+    head_buf: List[str] = []
+    head_len = 0
+    tail_ring = deque(maxlen=tail)
+    seen_after_head = 0
+
+    async for chunk in chunks:
+        if head_len < head:
+            taken = chunk[:head - head_len]
+            head_buf.append(taken)
+            head_len += len(taken)
+            chunk = chunk[len(taken):]
+        if chunk:
+            seen_after_head += len(chunk)
+            tail_ring.extend(chunk)
+
+    dropped = seen_after_head - len(tail_ring)
+    if dropped:
+        return "".join(head_buf) + f"\n... [TRUNCATED {dropped} chars] ...\n" + "".join(tail_ring)
+    return "".join(head_buf) + "".join(tail_ring)
+
 class BaseTool(ABC, BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     
@@ -26,11 +59,20 @@ class BaseTool(ABC, BaseModel):
     description: str
     parameters: Optional[dict] = None
     instructions: Optional[str] = None  # Specific expert guidelines for this tool
+    parallel_safe: bool = False  # Opt-in: only tools with no shared state may run concurrently or be prefetched
+    cacheable: bool = False  # Opt-in: results depend only on the arguments
+    cache_ttl: int = 3600
 
     @abstractmethod
     async def execute(self, **kwargs) -> Any:
+        # May also be an async generator yielding str chunks; ToolCollection caps those
+        # with collect_capped so huge outputs never get materialized in full.
         pass
 
+    def cache_args(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """What a cached result is keyed on; override to add state outside the arguments."""
+        return args
+
     def to_param(self) -> Dict:
         return {
             "type": "function",
@@ -41,35 +83,110 @@ class BaseTool(ABC, BaseModel):
             },
         }
 
+class ToolCache:
+    """Two-tier cache for tool results: in-memory LRU in front of a SQLite file."""
+
+    def __init__(self, path: str, max_entries: int = 1000, memory_entries: int = 128):
+        self.memory: "OrderedDict[str, dict]" = OrderedDict()
+        self.memory_entries = memory_entries
+        self.disk = DiskCache(path, table="tool_results", max_entries=max_entries)
+
+    @staticmethod
+    def make_key(name: str, args: Optional[Dict[str, Any]]) -> str:
+        return f"{name}:{json.dumps(args or {}, sort_keys=True, ensure_ascii=False)}"
+
+    def get(self, key: str) -> Optional[ToolResult]:
+        from tools.monitoring import Monitoring
+
+        entry = self.memory.get(key)
+        if entry is not None and entry["expires"] < time.time():
+            del self.memory[key]
+            entry = None
+        if entry is None:
+            raw = self.disk.get(key)
+            if raw is not None:
+                entry = json.loads(raw)
+                self._remember(key, entry)
+        else:
+            self.memory.move_to_end(key)
+
+        Monitoring.log_cache_stats(entry is not None)
+        if entry is None:
+            return None
+        return ToolResult(output=entry["output"], base64_image=entry["base64_image"])
+
+    def set(self, key: str, result: ToolResult, ttl: int):
+        # Only plain-text successes are worth replaying; cacheable tools report failures via ToolResult.error
+        if result.error or not isinstance(result.output, str):
+            return
+        entry = {"output": result.output, "base64_image": result.base64_image, "expires": time.time() + ttl}
+        self._remember(key, entry)
+        self.disk.set(key, json.dumps(entry, ensure_ascii=False), ttl)
+
+    def _remember(self, key: str, entry: dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+_TOOL_CACHE: Optional[ToolCache] = None
+
+def get_tool_cache() -> Optional[ToolCache]:
+    """Process-wide tool cache, or None when caching is disabled in config."""
+    global _TOOL_CACHE
+    if _TOOL_CACHE is None and settings.cache.enabled:
+        _TOOL_CACHE = ToolCache(settings.cache.tool_cache_file, settings.cache.tool_cache_max_entries)
+    return _TOOL_CACHE
+
 class ToolCollection:
     """A collection of defined tools."""
 
     def __init__(self, *tools: BaseTool):
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
+        self._params: Optional[List[Dict[str, Any]]] = None
 
     def __iter__(self):
         return iter(self.tools)
 
     def to_params(self) -> List[Dict[str, Any]]:
-        return [tool.to_param() for tool in self.tools]
+        # Same list every turn until the tool set changes (lets the LLM cache fingerprint it once)
+        if self._params is None:
+            self._params = [tool.to_param() for tool in self.tools]
+        return self._params
 
     async def execute(self, *, name: str, tool_input: Dict[str, Any] = None) -> ToolResult:
         tool = self.tool_map.get(name)
         if not tool:
             return ToolResult(error=f"Tool {name} is invalid")
+
+        cache = get_tool_cache() if tool.cacheable else None
+        if cache:
+            cache_key = cache.make_key(name, tool.cache_args(tool_input or {}))
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         try:
-            result = await tool.execute(**(tool_input or {}))
-            if isinstance(result, ToolResult):
-                return result
-            return ToolResult(output=result)
+            result = tool.execute(**(tool_input or {}))
+            if inspect.isasyncgen(result):
+                result = await collect_capped(result)
+            else:
+                result = await result
+            if not isinstance(result, ToolResult):
+                result = ToolResult(output=result)
         except Exception as e:
             return ToolResult(error=str(e))
 
+        if cache:
+            cache.set(cache_key, result, tool.cache_ttl)
+        return result
+
     def get_tool(self, name: str) -> BaseTool:
         return self.tool_map.get(name)
 
     def add_tools(self, *tools: BaseTool):
         self.tools += tools
+        self._params = None
         for tool in tools:
             self.tool_map[tool.name] = tool
@@ -1,63 +1,68 @@
 import asyncio
 import json
+from types import SimpleNamespace
 from typing import AsyncGenerator, Dict, Any, List
 from agent_core import ManusCompetition, Message, AgentState
 from base_tool import ToolResult
 
-# Mock LLM that returns pre-defined responses to find bugs in the loop logic
+def _chunk(content=None, tool_calls=None, finish_reason=None):
+    """A streamed completion chunk with the fields the agent reads."""
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)], usage=None)
+
+# Mock LLM that streams pre-defined responses to find bugs in the loop logic
 class MockLLM:
     def __init__(self, responses: List[Dict]):
         self.responses = responses
         self.call_count = 0
 
-    async def ask_tool(self, messages, tools, tool_choice="auto"):
+    async def ask_tool_stream(self, messages, tools, tool_choice="auto", namespace=None, **kwargs) -> AsyncGenerator[Any, None]:
         if self.call_count >= len(self.responses):
             # Default to termination if we run out of mock responses
-            return type('obj', (object,), {
+            resp_data = {
                 "content": "All tasks done.",
-                "tool_calls": [type('obj', (object,), {
-                    "id": "exit",
-                    "function": type('obj', (object,), {"name": "terminate", "arguments": '{"output": "Finished simulation"}'})
-                })]
-            })
-        
-        resp_data = self.responses[self.call_count]
-        self.call_count += 1
-        
-        return type('obj', (object,), {
-            "content": resp_data.get("content", ""),
-            "tool_calls": [type('obj', (object,), {
-                "id": f"call_{i}",
-                "function": type('obj', (object,), {"name": tc["name"], "arguments": json.dumps(tc["args"])})
-            }) for i, tc in enumerate(resp_data.get("tool_calls", []))]
-        })
+                "tool_calls": [{"id": "exit", "name": "terminate", "args": {"output": "Finished simulation"}}]
+            }
+        else:
+            resp_data = self.responses[self.call_count]
+            self.call_count += 1
+
+        if resp_data.get("content"):
+            yield _chunk(content=resp_data["content"])
+        tool_calls = resp_data.get("tool_calls", [])
+        for i, tc in enumerate(tool_calls):
+            function = SimpleNamespace(name=tc["name"], arguments=json.dumps(tc["args"]))
+            yield _chunk(tool_calls=[SimpleNamespace(index=i, id=tc.get("id", f"call_{i}"), function=function)])
+        yield _chunk(finish_reason="tool_calls" if tool_calls else "stop")
 
     async def quick_ask(self, messages, max_tokens=200, model=None):
         return "PROCEED"
 
 # Mock Tool to verify path handling and error propagation
 class MockTool:
-    async def execute(self, name, args):
+    async def execute(self, *, name, tool_input=None):
+        args = tool_input or {}
         if name == "terminal" and "dir" in args.get("command", ""):
             if "Incorrect Path" in args.get("command"):
                 return "File not found."
             return "Volume in drive D is Data..."
         if name == "search" and args.get("query") == "massive":
             return "DATA-START " + ("A" * 10000) + " DATA-END"
+        if name == "scraper":
+            return ToolResult(error="Failed to scrape URL: connection reset")
         return f"Mock result for {name}"
 
-async def run_simulation(name: str, scenario_responses: List[Dict]):
+async def run_simulation(name: str, scenario_responses: List[Dict], expect_in_memory: str = None):
     print(f"\n--- 🕵️ Scenario: {name} ---")
     agent = ManusCompetition()
     agent.llm = MockLLM(scenario_responses)
     agent.available_tools.execute = MockTool().execute
     
     try:
-        async for chunk in agent.run("Start simulation"):
-            if chunk.get("type") == "status":
-                print(f"[STATUS] {chunk['content']}")
-            elif chunk.get("type") == "content":
-                print(f"[CONTENT] {chunk['content']}")
+        agent.initialize("Start simulation")
+        await agent.run()
+        if expect_in_memory and not any(expect_in_memory in (m.content or "") for m in agent.memory.messages):
+            raise AssertionError(f"{expect_in_memory!r} never reached memory")
         print(f"✅ {name} Finished successfully.")
     except Exception as e:
         print(f"❌ {name} Failed with error: {e}")
@@ -87,6 +92,14 @@ async def main():
         }
     ])
 
+    # Test 5: Tool failures must reach the model as text, not as an empty output
+    await run_simulation("Tool Error Propagation", [
+        {
+            "content": "Let me read that page.",
+            "tool_calls": [{"name": "scraper", "args": {"url": "https://example.com"}}]
+        }
+    ], expect_in_memory="Error: Failed to scrape URL: connection reset")
+
     # Test 6: Poisoned Control Tokens (Verification of Phase 9)
     await run_simulation("Control Token Sanitization", [
         {
@@ -1,16 +1,24 @@
 import os
-import toml
-from pydantic import BaseModel, Field
-from typing import List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Callable, Dict, List, Tuple
 
-class BackupProvider(BaseModel):
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+class _ConfigModel(BaseModel):
+    """Settings are read once from trusted local TOML and never mutated afterwards."""
+    model_config = ConfigDict(frozen=True)
+
+class BackupProvider(_ConfigModel):
     name: str = "backup"
     api_key: str = ""
     model_name: str = ""
     base_url: str = ""
     supports_tools: bool = True
 
-class LLMSettings(BaseModel):
+class LLMSettings(_ConfigModel):
     api_key: str = ""
     model_name: str = "gpt-oss-120b"
     vision_model_name: str = "llama-4-maverick-17b-128e-instruct"
@@ -19,27 +27,62 @@ class LLMSettings(BaseModel):
     # List of additional backup providers
     backups: List[BackupProvider] = []
 
-class ToolSettings(BaseModel):
+    # Connection pooling (one keep-alive pool per provider host)
+    http2: bool = True
+    max_keepalive_connections: int = 20
+    max_connections: int = 100
+    keepalive_expiry: float = 30.0
+
+    # Retries per provider on transient errors before failing over (2 = three attempts, as with the
+    # old tenacity setup); delay is base * 2**attempt + jitter
+    max_retries: int = 2
+    backoff_base: float = 1.0
+
+    # Seconds to wait on a provider before racing the next backup alongside it (0 = strict sequential failover)
+    hedge_delay: float = 0.0
+    # After the primary fails, fire the N cheapest backups at once and keep the first answer.
+    # Off by default: a transient error then costs N requests instead of one.
+    failover_race: bool = False
+    failover_race_size: int = 2
+
+class ToolSettings(_ConfigModel):
     tavily_api_key: str = ""
+    # Attach the browser tool to an already running Chromium (e.g. http://localhost:9222) instead of
+    # launching one, so several agent processes can share it
+    browser_cdp_url: str = ""
+    # Close an agent's browser context after this many idle seconds, in case it never reaches cleanup (0 = never)
+    browser_idle_timeout: float = 300.0
     enabled: List[str] = ["search", "memory", "file_ops", "calculator", "scraper", "python_repl", "browser", "ask_human", "terminal"]
 
-class AgentSettings(BaseModel):
+class AgentSettings(_ConfigModel):
     max_steps: int = 20
     name: str = "Manus-Củ-Sen"
 
-class CacheSettings(BaseModel):
+class CacheSettings(_ConfigModel):
     enabled: bool = True
     ttl_seconds: int = 300
+    # Persistent cache for tools that opt in with `cacheable = True`
+    tool_cache_file: str = "outputs/tool_cache.db"
+    tool_cache_max_entries: int = 1000
+    # Disk tier of the LLM response cache (entries expire after ttl_seconds)
+    response_cache_file: str = "outputs/response_cache.db"
+    # Serve paraphrased prompts from cache by embedding similarity (needs sentence-transformers)
+    semantic_enabled: bool = False
+    semantic_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    semantic_threshold: float = 0.92
 
-class MemoryStoreSettings(BaseModel):
+class MemoryStoreSettings(_ConfigModel):
     file_path: str = "memory.json"
     max_age_days: int = 7
 
-class MonitoringSettings(BaseModel):
+class MonitoringSettings(_ConfigModel):
     track_usage: bool = True
     usage_file: str = "usage.json"
 
-class Settings(BaseModel):
+# Parsed settings keyed by (config path, mtime) so an unchanged file is never re-parsed
+_CONFIG_CACHE: Dict[Tuple[str, int], "Settings"] = {}
+
+class Settings(_ConfigModel):
     llm: LLMSettings = LLMSettings()
     tools: ToolSettings = ToolSettings()
     agent: AgentSettings = AgentSettings()
@@ -52,44 +95,70 @@ class Settings(BaseModel):
         base_dir = os.path.dirname(os.path.abspath(__file__))
         config_path = os.path.join(base_dir, "config.toml")
         
+        try:
+            mtime = os.stat(config_path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        key = (config_path, mtime)
+        if key in _CONFIG_CACHE:
+            return _CONFIG_CACHE[key]
+
         config_temp = {}
-        if os.path.exists(config_path):
+        if mtime:
             try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    config_temp = toml.load(f)
+                with open(config_path, "rb") as f:
+                    config_temp = tomllib.load(f)
             except Exception as e:
                 print(f"Warning: Failed to load config.toml: {e}")
 
-        return cls(**config_temp)
+        loaded = cls.model_validate(config_temp)
+        _CONFIG_CACHE[key] = loaded
+        return loaded
 
 settings_obj = Settings.load()
 
+# Flat legacy names -> accessor on the nested Settings object
+_LEGACY_MAP: Dict[str, Callable[[Settings], Any]] = {
+    "API_KEY": lambda s: s.llm.api_key,
+    "MODEL_NAME": lambda s: s.llm.model_name,
+    "VISION_MODEL_NAME": lambda s: s.llm.vision_model_name,
+    "BASE_URL": lambda s: s.llm.base_url,
+
+    # Multiple Backup Providers
+    "BACKUPS": lambda s: s.llm.backups,
+
+    "TAVILY_API_KEY": lambda s: s.tools.tavily_api_key,
+    "MAX_STEPS": lambda s: s.agent.max_steps,
+
+    # New settings access (keeping flat for old code, adding nested for new code)
+    "ENABLED_TOOLS": lambda s: s.tools.enabled,
+    "CACHE_ENABLED": lambda s: s.cache.enabled,
+    "CACHE_TTL": lambda s: s.cache.ttl_seconds,
+    "MEMORY_FILE": lambda s: s.memory.file_path,
+    "TRACK_USAGE": lambda s: s.monitoring.track_usage,
+    "USAGE_FILE": lambda s: s.monitoring.usage_file,
+    "name": lambda s: s.agent.name,
+
+    # Nested object support for 1:1 mapping in new logic
+    "llm": lambda s: s.llm,
+    "cache": lambda s: s.cache,
+    "tools": lambda s: s.tools,
+    "monitoring": lambda s: s.monitoring,
+}
+
 # For backward compatibility and easy access
 class LegacySettings:
+    """Read-only view that resolves the old flat attribute names against the live Settings."""
+    __slots__ = ("_s",)
+
     def __init__(self, s: Settings):
-        self.API_KEY = s.llm.api_key
-        self.MODEL_NAME = s.llm.model_name
-        self.VISION_MODEL_NAME = s.llm.vision_model_name
-        self.BASE_URL = s.llm.base_url
-        
-        # Multiple Backup Providers
-        self.BACKUPS = s.llm.backups
-        
-        self.TAVILY_API_KEY = s.tools.tavily_api_key
-        self.MAX_STEPS = s.agent.max_steps
-        
-        # New settings access (keeping flat for old code, adding nested for new code)
-        self.ENABLED_TOOLS = s.tools.enabled
-        self.CACHE_ENABLED = s.cache.enabled
-        self.CACHE_TTL = s.cache.ttl_seconds
-        self.MEMORY_FILE = s.memory.file_path
-        self.TRACK_USAGE = s.monitoring.track_usage
-        self.USAGE_FILE = s.monitoring.usage_file
-        self.name = s.agent.name
-        
-        # Nested object support for 1:1 mapping in new logic
-        self.cache = s.cache
-        self.tools = s.tools
-        self.monitoring = s.monitoring
+        self._s = s
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            accessor = _LEGACY_MAP[name]
+        except KeyError:
+            raise AttributeError(f"'LegacySettings' object has no attribute '{name}'") from None
+        return accessor(self._s)
 
 settings = LegacySettings(settings_obj)
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple, Union
+
+Key = Union[str, bytes]
+
+
+class DiskCache:
+    """Tiny SQLite key/value store with per-entry TTL, used as the L2 tier of our caches."""
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 1000):
+        self.table = table
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key BLOB PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def get(self, key: Key) -> Optional[Union[str, bytes]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            return row[0]
+
+    def set(self, key: Key, value: Union[str, bytes], ttl: float):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            self._evict()
+
+    def set_many(self, items: List[Tuple[Key, Union[str, bytes]]], ttl: float):
+        """Write a batch of entries in a single transaction."""
+        expires = time.time() + ttl
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                    [(key, value, expires) for key, value in items],
+                )
+                self._evict()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _evict(self):
+        """Drop expired rows, then the soonest-to-expire ones if we are over capacity."""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires < ?", (time.time(),))
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY expires LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
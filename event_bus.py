@@ -1,9 +1,31 @@
-from typing import Callable, Awaitable, List
+from typing import Any, Callable, Awaitable, Dict, List, Optional
+from dataclasses import dataclass, field
 import asyncio
+from loguru import logger
+
+# Events the UI must not miss; everything else (e.g. 'status') is dropped when the queue is full
+CRITICAL_EVENTS = frozenset({"terminal", "browser", "browser_view"})
+
+@dataclass(slots=True, frozen=True)
+class Event:
+    """A published event; extra keyword arguments from publish() land in `extra`."""
+    type: str
+    content: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+    _dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Flat {"type", "content", **extra} payload for listeners that want the old dict shape."""
+        if self._dict is None:
+            object.__setattr__(self, "_dict", {"type": self.type, "content": self.content, **self.extra})
+        return self._dict
 
 class EventBus:
     _instance = None
-    _listeners: List[Callable[[dict], Awaitable[None]]] = []
+    _listeners: List[Callable[[Event], Awaitable[None]]] = []
+    _queue: Optional[asyncio.Queue] = None
+    _dispatcher_task: Optional[asyncio.Task] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -12,25 +34,60 @@ class EventBus:
         return cls._instance
 
     @classmethod
-    def subscribe(cls, listener: Callable[[dict], Awaitable[None]]):
+    def subscribe(cls, listener: Callable[[Event], Awaitable[None]]):
         cls._listeners.append(listener)
 
+    @classmethod
+    def has_listeners(cls) -> bool:
+        """Lets publishers skip building expensive payloads (e.g. screenshots) nobody will receive."""
+        return bool(cls._listeners)
+
+    @classmethod
+    def _ensure_dispatcher(cls) -> asyncio.Queue:
+        """Lazily start the dispatcher on the running loop (queues are bound to a single loop)."""
+        loop = asyncio.get_running_loop()
+        if cls._loop is not loop or cls._dispatcher_task is None or cls._dispatcher_task.done():
+            cls._loop = loop
+            cls._queue = asyncio.Queue(maxsize=1024)
+            cls._dispatcher_task = loop.create_task(cls._dispatch_loop(cls._queue))
+        return cls._queue
+
+    @classmethod
+    async def _dispatch_loop(cls, queue: asyncio.Queue):
+        while True:
+            payload: Event = await queue.get()
+            try:
+                # Fan out concurrently so one slow listener doesn't delay the others
+                results = await asyncio.gather(*(listener(payload) for listener in cls._listeners), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Error in event listener: {result}")
+            finally:
+                queue.task_done()
+
+    @classmethod
+    async def flush(cls):
+        """Wait until every queued event has been delivered."""
+        if cls._queue is not None and cls._loop is asyncio.get_running_loop():
+            await cls._queue.join()
+
     @classmethod
     async def publish(cls, event_type: str, content: str = None, **kwargs):
         """
-        Publish an event to all subscribers.
+        Queue an event for all subscribers and return without waiting for delivery.
         common types: 'status' (thinking), 'terminal' (commands), 'browser' (screenshots)
         """
-        payload = {
-            "type": event_type,
-            "content": content,
-            **kwargs
-        }
-        for listener in cls._listeners:
-            try:
-                await listener(payload)
-            except Exception as e:
-                print(f"Error in event listener: {e}")
+        if not cls._listeners:
+            return
+        payload = Event(event_type, content, kwargs)
+        queue = cls._ensure_dispatcher()
+        if event_type in CRITICAL_EVENTS:
+            await queue.put(payload)
+            return
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.debug(f"Event queue full, dropping '{event_type}' event")
 
 # Global instance
 bus = EventBus()
@@ -1,12 +1,25 @@
-import json
+import asyncio
+import functools
+import hashlib
+import importlib.util
 import os
-from typing import Any, Dict, List, Optional, AsyncGenerator
+import random
+import ssl
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, AsyncGenerator, Tuple
 from datetime import datetime
+from itertools import islice
+import certifi
+import httpx
+import orjson
+import openai
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from loguru import logger
-from tenacity import retry, stop_after_attempt, wait_exponential
 
 from config import settings
+from disk_cache import DiskCache
+from prompts import cacheable_system_blocks
 
 # =============================================================================
 # USAGE TRACKING & COST OPTIMIZATION
@@ -23,17 +36,26 @@ class UsageTracker:
         "cerebras": {"input": 0.10, "output": 0.10},     # Cheap
         "default": {"input": 1.0, "output": 2.0}         # Conservative estimate
     }
+    # Per-token (input, output) multipliers, precomputed so record_usage is two multiplies
+    _COST_FACTORS = {p: (c["input"] / 1_000_000, c["output"] / 1_000_000) for p, c in COST_PER_M_TOKENS.items()}
     
-    def __init__(self, usage_file: str = "outputs/usage_stats.json"):
+    # Seconds between background snapshots of the session stats
+    FLUSH_INTERVAL = 10.0
+
+    def __init__(self, usage_file: str = "outputs/usage_stats.jsonl"):
         self.usage_file = usage_file
+        # Sessions recorded before the JSONL log, still counted in the all-time totals
+        self.legacy_file = os.path.splitext(usage_file)[0] + ".json"
         self.session_stats = {
             "total_input_tokens": 0,
             "total_output_tokens": 0,
             "total_requests": 0,
             "estimated_cost_usd": 0.0,
-            "by_provider": {},
+            "by_provider": defaultdict(lambda: {"input_tokens": 0, "output_tokens": 0, "requests": 0, "cost_usd": 0.0}),
             "session_start": datetime.now().isoformat()
         }
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
         self._ensure_output_dir()
     
     def _ensure_output_dir(self):
@@ -46,98 +68,518 @@ class UsageTracker:
         self.session_stats["total_requests"] += 1
         
         # Calculate cost
-        costs = self.COST_PER_M_TOKENS.get(provider, self.COST_PER_M_TOKENS["default"])
-        cost = (input_tokens * costs["input"] + output_tokens * costs["output"]) / 1_000_000
+        cost_in, cost_out = self._COST_FACTORS.get(provider) or self._COST_FACTORS["default"]
+        cost = input_tokens * cost_in + output_tokens * cost_out
         self.session_stats["estimated_cost_usd"] += cost
         
         # Track by provider
-        if provider not in self.session_stats["by_provider"]:
-            self.session_stats["by_provider"][provider] = {
-                "input_tokens": 0, "output_tokens": 0, "requests": 0, "cost_usd": 0.0
-            }
         prov_stats = self.session_stats["by_provider"][provider]
         prov_stats["input_tokens"] += input_tokens
         prov_stats["output_tokens"] += output_tokens
         prov_stats["requests"] += 1
         prov_stats["cost_usd"] += cost
-    
-    def save(self):
-        """Save usage statistics to file."""
+
+        self._dirty = True
+        self._ensure_flush_task()
+
+    def _ensure_flush_task(self):
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+            except RuntimeError:
+                pass  # No running loop; save() at shutdown still persists the session
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await self.save_async()
+
+    def _take_snapshot(self) -> Optional[bytes]:
+        # Serialize and clear the flag on the recording thread: usage recorded while the write
+        # is in flight marks the session dirty again instead of being lost
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return orjson.dumps(self.session_stats) + b"\n"
+
+    def _append(self, snapshot: bytes):
         try:
-            # Load existing stats if available
-            existing = {}
-            if os.path.exists(self.usage_file):
-                with open(self.usage_file, "r", encoding="utf-8") as f:
-                    existing = json.load(f)
-            
-            # Append this session
-            if "sessions" not in existing:
-                existing["sessions"] = []
-            existing["sessions"].append(self.session_stats)
-            
-            # Update cumulative totals
-            existing["cumulative"] = {
-                "total_input_tokens": sum(s["total_input_tokens"] for s in existing["sessions"]),
-                "total_output_tokens": sum(s["total_output_tokens"] for s in existing["sessions"]),
-                "total_requests": sum(s["total_requests"] for s in existing["sessions"]),
-                "total_cost_usd": sum(s["estimated_cost_usd"] for s in existing["sessions"])
-            }
-            
-            with open(self.usage_file, "w", encoding="utf-8") as f:
-                json.dump(existing, f, indent=2, ensure_ascii=False)
+            with open(self.usage_file, "ab") as f:
+                f.write(snapshot)
         except Exception as e:
+            self._dirty = True
             logger.warning(f"Failed to save usage stats: {e}")
-    
+
+    def save(self):
+        """Append a snapshot of this session to the JSONL usage log (no-op if nothing changed)."""
+        snapshot = self._take_snapshot()
+        if snapshot is not None:
+            self._append(snapshot)
+
+    async def save_async(self):
+        """save() with the file write off the event loop."""
+        snapshot = self._take_snapshot()
+        if snapshot is not None:
+            await asyncio.to_thread(self._append, snapshot)
+
+    def get_cumulative(self) -> Dict[str, Any]:
+        """Totals across all recorded sessions, including this one.
+
+        The log holds a cumulative snapshot per flush, so only the latest row of each session counts.
+        """
+        sessions: Dict[str, dict] = {}
+        try:
+            with open(self.legacy_file, "rb") as f:
+                for s in orjson.loads(f.read()).get("sessions", ()):
+                    sessions[s["session_start"]] = s
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to read legacy usage stats: {e}")
+        try:
+            with open(self.usage_file, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        s = orjson.loads(line)
+                        sessions[s["session_start"]] = s
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to read usage stats: {e}")
+        sessions[self.session_stats["session_start"]] = self.session_stats
+        return {
+            "total_input_tokens": sum(s["total_input_tokens"] for s in sessions.values()),
+            "total_output_tokens": sum(s["total_output_tokens"] for s in sessions.values()),
+            "total_requests": sum(s["total_requests"] for s in sessions.values()),
+            "total_cost_usd": sum(s["estimated_cost_usd"] for s in sessions.values())
+        }
+
+    def stop(self):
+        """Cancel the background snapshot loop (call at shutdown, before the final save)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
     def get_summary(self) -> str:
-        """Get a summary of this session's usage."""
+        """Get a summary of this session's usage, with all-time totals."""
         s = self.session_stats
+        total = self.get_cumulative()
         return (
             f"📊 Session Stats: {s['total_requests']} requests, "
             f"{s['total_input_tokens'] + s['total_output_tokens']} tokens, "
-            f"≈${s['estimated_cost_usd']:.4f}"
+            f"≈${s['estimated_cost_usd']:.4f} | All-time: {total['total_requests']} requests, "
+            f"≈${total['total_cost_usd']:.4f}"
         )
 
+# One hash everywhere: the keys are persisted in the response cache's SQLite file, so they must not
+# change with whichever optional packages happen to be installed
+def _hash128(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# (tools list, fingerprint) of the last tool set seen; ToolCollection hands out the same list every turn
+_TOOLS_MEMO: Optional[Tuple[List[dict], bytes]] = None
+
+def _tools_fingerprint(tools: Optional[List[dict]]) -> bytes:
+    """Sorted tool names as bytes, computed once per tool set and shared by every cache."""
+    global _TOOLS_MEMO
+    if not tools:
+        return b""
+    if _TOOLS_MEMO is not None and _TOOLS_MEMO[0] is tools:
+        return _TOOLS_MEMO[1]
+    fingerprint = orjson.dumps(sorted(t.get("function", {}).get("name", "") for t in tools))
+    _TOOLS_MEMO = (tools, fingerprint)
+    return fingerprint
+
 # =============================================================================
 # RESPONSE CACHE FOR COST SAVINGS
 # =============================================================================
 
 class ResponseCache:
-    """Simple in-memory cache for repeated queries."""
+    """In-memory LRU cache for repeated queries, optionally backed by a SQLite file across runs.
+
+    Each key holds a list of samples. Callers that pass a namespace (e.g. one per agent
+    session) walk that list in order and miss once they have used every sample, so a repeated
+    prompt still gets fresh answers within a session while a rerun replays the same ones.
+    Without a namespace the first sample is always returned.
+    """
     
-    def __init__(self, max_size: int = 100):
-        self.cache: Dict[str, Any] = {}
+    def __init__(self, max_size: int = 100, disk: Optional[DiskCache] = None, ttl: int = 300):
+        self.cache: "OrderedDict[bytes, List[Any]]" = OrderedDict()
+        # key -> namespace -> index of the next unused sample
+        self._cursors: Dict[bytes, Dict[Any, int]] = {}
         self.max_size = max_size
+        self.disk = disk
+        self.ttl = ttl
+        # Disk writes are queued and flushed in batches by one background task
+        self._pending: List[Tuple[bytes, List[Any]]] = []
+        self._writer: Optional[asyncio.Task] = None
         self.hits = 0
         self.misses = 0
     
-    def _make_key(self, messages: List[dict], tools: List[dict] = None) -> str:
+    def _make_key(self, messages: List[dict], tools: List[dict] = None) -> bytes:
         """Create a cache key from messages and tools."""
         # Use last 3 messages for key (balance between precision and reuse)
         recent = messages[-3:] if len(messages) > 3 else messages
-        key_parts = [str(m.get("content", ""))[:100] for m in recent]
-        if tools:
-            key_parts.append(str(len(tools)))  # Just tool count for key
-        return hash(tuple(key_parts))
+        # Hash full contents: a prefix would collide on queries that only differ later on. Tool-call-only
+        # assistant turns have no content, so the calls and the ids tying results to them count too.
+        key_parts = [
+            [
+                m.get("role"),
+                m.get("content"),
+                m.get("tool_call_id"),
+                [[tc["function"]["name"], tc["function"]["arguments"]] for tc in m.get("tool_calls") or ()],
+            ]
+            for m in recent
+        ]
+        return _hash128(orjson.dumps(key_parts, default=str) + _tools_fingerprint(tools))
     
-    def get(self, messages: List[dict], tools: List[dict] = None) -> Optional[Any]:
+    def get(self, messages: List[dict], tools: List[dict] = None, namespace: Any = None) -> Optional[Any]:
         """Get cached response if available."""
         key = self._make_key(messages, tools)
-        if key in self.cache:
-            self.hits += 1
-            logger.debug(f"Cache hit! ({self.hits} hits, {self.misses} misses)")
-            return self.cache[key]
-        self.misses += 1
-        return None
+        samples = self._samples(key)
+        response = self._pick(key, samples, namespace) if samples else None
+        if response is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.debug("Cache hit! ({} hits, {} misses)", self.hits, self.misses)
+        return response
     
-    def set(self, messages: List[dict], response: Any, tools: List[dict] = None):
-        """Cache a response."""
-        if len(self.cache) >= self.max_size:
-            # Remove oldest entry (simple FIFO)
-            oldest_key = next(iter(self.cache))
-            del self.cache[oldest_key]
-        
+    def set(self, messages: List[dict], response: Any, tools: List[dict] = None, namespace: Any = None):
+        """Cache a response as another sample for its key."""
         key = self._make_key(messages, tools)
-        self.cache[key] = response
+        samples = self._add_sample(key, response, namespace)
+        if hasattr(response, "model_dump_json"):
+            self._queue_write(key, samples)
+
+    def _samples(self, key: bytes) -> Optional[List[Any]]:
+        """Samples for a key from memory, falling back to the disk tier."""
+        samples = self.cache.get(key)
+        if samples is not None:
+            self.cache.move_to_end(key)
+        elif self.disk is not None:
+            samples = self._load(key)
+            if samples:
+                self._remember(key, samples)
+        return samples
+
+    WRITE_DELAY = 0.2
+
+    def _queue_write(self, key: bytes, samples: List[Any]):
+        if self.disk is None:
+            return
+        self._pending.append((key, samples))
+        if self._writer is None or self._writer.done():
+            try:
+                self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+            except RuntimeError:
+                self._write_batch(self._take_pending())
+
+    def _take_pending(self) -> List[Tuple[bytes, List[Any]]]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _write_batch(self, batch: List[Tuple[bytes, List[Any]]]):
+        try:
+            rows = {key: self._dump_samples(samples) for key, samples in batch}
+            self.disk.set_many(list(rows.items()), self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to persist cached responses: {e}")
+
+    @staticmethod
+    def _dump_samples(samples: List[Any]) -> bytes:
+        # A streamed sample is the list of chunks it was made of
+        return b"[" + b",".join(
+            ResponseCache._dump_samples(s) if isinstance(s, list) else s.model_dump_json().encode()
+            for s in samples
+        ) + b"]"
+
+    def _load(self, key: bytes) -> Optional[List[Any]]:
+        raw = self.disk.get(key)
+        if raw is None:
+            return None
+        try:
+            data = orjson.loads(raw)
+            if key.startswith(b"stream:"):
+                return [[ChatCompletionChunk.model_validate(c) for c in s] for s in data]
+            # Entries written before samples were kept hold a single response
+            return [ChatCompletion.model_validate(d) for d in (data if isinstance(data, list) else [data])]
+        except Exception as e:
+            logger.debug("Discarding unreadable cached response: {}", e)
+            return None
+
+    async def _write_loop(self):
+        # Serialization and the SQLite transaction both run off the event loop
+        while self._pending:
+            await asyncio.sleep(self.WRITE_DELAY)
+            await asyncio.to_thread(self._write_batch, self._take_pending())
+
+    async def flush(self):
+        """Write any queued entries now (call at shutdown)."""
+        if self._writer is not None:
+            self._writer.cancel()
+        batch = self._take_pending()
+        if batch:
+            await asyncio.to_thread(self._write_batch, batch)
+
+    def get_stream(self, messages: List[dict], tools: List[dict] = None, namespace: Any = None) -> Optional[List[Any]]:
+        """Cached chunk sequence of a streamed answer."""
+        key = b"stream:" + self._make_key(messages, tools)
+        samples = self._samples(key)
+        chunks = self._pick(key, samples, namespace) if samples else None
+        if chunks is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.debug("Stream cache hit! ({} hits, {} misses)", self.hits, self.misses)
+        return chunks
+
+    def set_stream(self, messages: List[dict], chunks: List[Any], tools: List[dict] = None, namespace: Any = None):
+        key = b"stream:" + self._make_key(messages, tools)
+        self._queue_write(key, self._add_sample(key, chunks, namespace))
+
+    def _pick(self, key: bytes, samples: List[Any], namespace: Any) -> Optional[Any]:
+        if namespace is None:
+            return samples[0]
+        cursors = self._cursors.setdefault(key, {})
+        index = cursors.get(namespace, 0)
+        if index >= len(samples):
+            return None
+        cursors[namespace] = index + 1
+        return samples[index]
+
+    def _add_sample(self, key: bytes, response: Any, namespace: Any) -> List[Any]:
+        samples = self.cache.get(key)
+        if samples is None:
+            samples = [response]
+        else:
+            samples.append(response)
+        self._remember(key, samples)
+        if namespace is not None:
+            # The caller has just used the sample it produced
+            self._cursors.setdefault(key, {})[namespace] = len(samples)
+        return samples
+
+    def _remember(self, key: bytes, samples: List[Any]):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+        elif len(self.cache) >= self.max_size:
+            # Evict the least recently used entry
+            evicted, _ = self.cache.popitem(last=False)
+            self._cursors.pop(evicted, None)
+        self.cache[key] = samples
+
+class SemanticResponseCache:
+    """Nearest-neighbour cache on a caller-supplied query, consulted after an exact-match miss.
+
+    The caller decides what the query is and when a lookup is meaningful: the last message of an
+    agent turn is a fixed step prompt, so embedding it would match every stored entry.
+
+    Needs numpy and sentence-transformers; both are imported lazily and the cache disables
+    itself if they are missing. Like ResponseCache, an entry is served at most once per namespace,
+    and streamed answers (chunk lists) are kept apart from complete responses.
+    """
+
+    def __init__(self, model_name: str, threshold: float = 0.92, max_size: int = 100):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_size = max_size
+        self.enabled = True
+        self._encoder = None
+        self._matrix = None  # (n, dim) int8-quantized unit embeddings, row i <-> self._entries[i]
+        # (signature, response, namespaces it has been served to)
+        self._entries: List[Tuple[bytes, Any, set]] = []
+
+    @staticmethod
+    def _signature(tools: Optional[List[dict]], stream: bool) -> bytes:
+        return (b"stream:" if stream else b"") + _tools_fingerprint(tools)
+
+    def _encode(self, text: str):
+        import numpy as np
+
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.model_name)
+        vector = self._encoder.encode([text], normalize_embeddings=True)[0]
+        # Unit vectors quantize to int8 with negligible loss for cosine ranking, at a quarter of the memory
+        return np.clip(np.rint(vector * 127), -127, 127).astype(np.int8)
+
+    async def embed(self, text: Optional[str]):
+        """Embedding of the query text, or None if there is nothing to look up."""
+        if not text or not self.enabled:
+            return None
+        try:
+            # Model loading and inference are CPU-bound; keep them off the event loop
+            return await asyncio.to_thread(self._encode, text)
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled: {e}")
+            self.enabled = False
+            return None
+
+    def get(self, vector, tools: Optional[List[dict]] = None, namespace: Any = None, stream: bool = False) -> Optional[Any]:
+        if vector is None or self._matrix is None:
+            return None
+        import numpy as np
+
+        # Widen before multiplying so int8 products can't overflow; 127 * 127 rescales to cosine
+        scores = self._matrix.astype(np.int32) @ vector.astype(np.int32)
+        best = int(scores.argmax())
+        similarity = scores[best] / (127 * 127)
+        signature, response, served = self._entries[best]
+        if similarity < self.threshold or signature != self._signature(tools, stream):
+            return None
+        if namespace is not None:
+            if namespace in served:
+                return None
+            served.add(namespace)
+        logger.debug("Semantic cache hit (similarity {:.3f})", float(similarity))
+        return response
+
+    def set(self, vector, response: Any, tools: Optional[List[dict]] = None, namespace: Any = None, stream: bool = False):
+        if vector is None:
+            return
+        import numpy as np
+
+        self._entries.append((self._signature(tools, stream), response, {namespace} if namespace is not None else set()))
+        rows = [vector] if self._matrix is None else [*self._matrix, vector]
+        if len(self._entries) > self.max_size:
+            # Drop the oldest entry
+            self._entries.pop(0)
+            rows = rows[1:]
+        self._matrix = np.stack(rows)
+
+# =============================================================================
+# SHARED HTTP CLIENTS
+# =============================================================================
+
+# Building an SSL context reads the CA bundle from disk, and every AsyncOpenAI gets its
+# own connection pool by default. Build the context once and keep one keep-alive pool per
+# provider host, so accounts on the same base_url reuse warm TLS connections.
+_SSL_CONTEXT: Optional[ssl.SSLContext] = None
+_HTTP_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+_CLIENT_CACHE: Dict[Tuple[str, str], AsyncOpenAI] = {}
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+# HTTP/2 multiplexes concurrent completions over one connection; needs the optional `h2` package
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+def _orjson_default(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class _OrjsonAsyncClient(httpx.AsyncClient):
+    """httpx client that encodes JSON request bodies with orjson (chat payloads can be 100KB+ per call)."""
+
+    def build_request(self, method, url, *, json: Any = None, content: Any = None, headers: Any = None, **kwargs) -> httpx.Request:
+        if json is not None and content is None:
+            try:
+                content = orjson.dumps(json, default=_orjson_default)
+            except TypeError:
+                pass  # Leave anything orjson can't encode (e.g. non-str keys) to httpx
+            else:
+                json = None
+                headers = httpx.Headers(headers)
+                headers["Content-Type"] = "application/json"
+        return super().build_request(method, url, json=json, content=content, headers=headers, **kwargs)
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """Pooled httpx client for one provider host, shared by every client that talks to it."""
+    global _SSL_CONTEXT
+    client = _HTTP_CLIENTS.get(base_url)
+    if client is None:
+        if _SSL_CONTEXT is None:
+            _SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+        client = _OrjsonAsyncClient(
+            verify=_SSL_CONTEXT,
+            http2=settings.llm.http2 and _HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_keepalive_connections=settings.llm.max_keepalive_connections,
+                max_connections=settings.llm.max_connections,
+                keepalive_expiry=settings.llm.keepalive_expiry,
+            ),
+            timeout=_HTTP_TIMEOUT,
+        )
+        _HTTP_CLIENTS[base_url] = client
+    return client
+
+def get_openai_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """One AsyncOpenAI per (api_key, base_url), on that provider's shared connection pool."""
+    key = (api_key, base_url)
+    client = _CLIENT_CACHE.get(key)
+    if client is None:
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=_HTTP_TIMEOUT, http_client=get_http_client(base_url))
+        _CLIENT_CACHE[key] = client
+    return client
+
+async def close_http_clients():
+    """Close every pooled connection (call once at shutdown)."""
+    clients = list(_HTTP_CLIENTS.values())
+    _HTTP_CLIENTS.clear()
+    _CLIENT_CACHE.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+# Ask for a final usage chunk so streamed turns are costed without counting tokens client-side
+_STREAM_OPTIONS = {"include_usage": True}
+
+_VISION_MODEL_TOKENS = ("vision", "vl", "gpt-4o", "claude-3", "gemini")
+# The configured vision model is multimodal by definition, whatever its name looks like
+_KNOWN_VISION_MODELS = frozenset(m.lower() for m in (settings.VISION_MODEL_NAME,) if m)
+
+@functools.lru_cache(maxsize=64)
+def _supports_vision(model: str) -> bool:
+    """Whether the model accepts image_url content parts (memoized per model name)."""
+    model = model.lower()
+    return model in _KNOWN_VISION_MODELS or any(token in model for token in _VISION_MODEL_TOKENS)
+
+# Prompt caching: providers bill a repeated prompt prefix at a steep discount, but only if it is
+# byte-identical across requests. OpenAI/DeepSeek-style APIs detect the prefix automatically, so the
+# static system prompt must stay verbatim at messages[0] (no timestamps, stable tool order, cwd frozen
+# at import in prompts.py). Anthropic-style endpoints need an explicit cache_control breakpoint,
+# placed after the static part of the system prompt by prompts.cacheable_system_blocks.
+# Anti-patterns: caching high-temperature sampling, and rotating per-turn data into the prefix
+# (which silently invalidates the cache on every request).
+_CACHE_CONTROL_MODEL_TOKENS = ("claude", "anthropic")
+
+@functools.lru_cache(maxsize=64)
+def _uses_cache_control(model: str) -> bool:
+    """Whether the model expects explicit cache_control breakpoints on the static prefix."""
+    model = model.lower()
+    return any(token in model for token in _CACHE_CONTROL_MODEL_TOKENS)
+
+@functools.lru_cache(maxsize=16)
+def _image_data_uri(base64_img: str) -> str:
+    """Screenshots can be megabytes; build each data URI once, however many requests reuse it."""
+    return f"data:image/jpeg;base64,{base64_img}"
+
+def _is_transient(e: BaseException) -> bool:
+    """Only connection problems, timeouts, rate limits and 5xx responses are worth retrying."""
+    # "All providers failed" carries the last provider error as its cause
+    if isinstance(e, RuntimeError) and e.__cause__ is not None:
+        e = e.__cause__
+    # APITimeoutError is a subclass of APIConnectionError
+    if isinstance(e, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+def _build_backup_templates() -> List[Dict[str, Any]]:
+    """Tool-capable backups from config, cheapest first (computed once at import)."""
+    templates = []
+    for b in settings.BACKUPS:
+        if b.api_key and b.supports_tools:
+            # Calculate cost score for sorting
+            provider_key = b.name.split('_')[0].lower() # e.g. "groq_primary" -> "groq"
+            costs = UsageTracker.COST_PER_M_TOKENS.get(provider_key, UsageTracker.COST_PER_M_TOKENS["default"])
+            templates.append({
+                "name": b.name,
+                "base_url": b.base_url,
+                "api_key": b.api_key,
+                "model": b.model_name,
+                "cost_score": costs["input"] + costs["output"]
+            })
+    # PHASE 12: Sort backups by cost score (ASC)
+    return sorted(templates, key=lambda x: x["cost_score"])
+
+_BACKUP_TEMPLATES = _build_backup_templates()
 
 # =============================================================================
 # MAIN LLM CLASS
@@ -148,129 +590,307 @@ class LLM:
 
     def __init__(self):
         # Primary Client
-        self.primary_client = AsyncOpenAI(
-            api_key=settings.API_KEY,
-            base_url=settings.BASE_URL
-        )
+        self.primary_client = get_openai_client(settings.API_KEY, settings.BASE_URL)
         self.primary_name = "primary"
         
-        # Dynamic Backup Clients - sorted by cost (cheapest first)
-        raw_backups = []
-        for b in settings.BACKUPS:
-            if b.api_key and b.supports_tools:
-                # Calculate cost score for sorting
-                provider_key = b.name.split('_')[0].lower() # e.g. "groq_primary" -> "groq"
-                costs = UsageTracker.COST_PER_M_TOKENS.get(provider_key, UsageTracker.COST_PER_M_TOKENS["default"])
-                cost_score = costs["input"] + costs["output"]
-                
-                raw_backups.append({
-                    "name": b.name,
-                    "client": AsyncOpenAI(api_key=b.api_key, base_url=b.base_url),
-                    "model": b.model_name,
-                    "cost_score": cost_score
-                })
-        
-        # PHASE 12: Sort backups by cost score (ASC)
-        self.backup_clients = sorted(raw_backups, key=lambda x: x["cost_score"])
+        # Dynamic Backup Clients - sorted by cost (cheapest first); clients are built on first failover
+        self.backup_clients = [dict(t) for t in _BACKUP_TEMPLATES]
         
         # Usage tracking and caching
         self.usage_tracker = UsageTracker()
-        self.cache = ResponseCache()
+        self.cache = ResponseCache(
+            disk=DiskCache(settings.cache.response_cache_file, table="responses") if settings.cache.enabled else None,
+            ttl=settings.cache.ttl_seconds,
+        )
+        # (id(messages), vision, cache_control) -> (source messages, prepared dicts)
+        self._prep_memo: "OrderedDict[tuple, Tuple[tuple, List[Dict[str, Any]]]]" = OrderedDict()
+        self.semantic_cache: Optional[SemanticResponseCache] = None
+        if settings.cache.enabled and settings.cache.semantic_enabled:
+            self.semantic_cache = SemanticResponseCache(settings.cache.semantic_model, settings.cache.semantic_threshold)
 
         if self.backup_clients and LLM._instances_count < 1:
             logger.debug(f"⚡ FUSION: {len(self.backup_clients)} backup networks available.")
         
         LLM._instances_count += 1
 
+    async def prewarm(self):
+        """Open a keep-alive connection to every provider host so the first request skips the TLS handshake."""
+        base_urls = {settings.BASE_URL, *(b["base_url"] for b in self.backup_clients)}
+
+        async def warm(base_url: str):
+            # Any response (even 404) leaves a warm connection in the pool
+            await get_http_client(base_url).head(base_url, timeout=5.0)
+
+        results = await asyncio.gather(*(warm(u) for u in base_urls), return_exceptions=True)
+        failed = sum(isinstance(r, Exception) for r in results)
+        logger.debug("Pre-warmed {}/{} provider connections.", len(base_urls) - failed, len(base_urls))
+
+    @staticmethod
+    def _backup_client(b: Dict[str, Any]) -> AsyncOpenAI:
+        """The backup's client, created the first time the backup is actually used."""
+        client = b.get("client")
+        if client is None:
+            client = b["client"] = get_openai_client(b["api_key"], b["base_url"])
+        return client
+
     def _extract_usage(self, response, provider: str):
         """Extract and record token usage from response."""
-        try:
-            if hasattr(response, 'usage') and response.usage:
-                self.usage_tracker.record_usage(
-                    provider=provider,
-                    input_tokens=response.usage.prompt_tokens or 0,
-                    output_tokens=response.usage.completion_tokens or 0
-                )
-        except Exception:
-            pass  # Usage tracking is best-effort
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        # Usage tracking is best-effort: providers may omit either count
+        self.usage_tracker.record_usage(
+            provider,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0
+        )
 
     def _prepare_messages(self, messages: List[Any], model: str) -> List[Dict[str, Any]]:
         """Pre-process messages for OpenAI compatibility, handling vision content."""
-        msg_dicts = []
-        supports_vision = any(x in model.lower() for x in ["vision", "vl", "gpt-4o", "claude-3", "gemini"])
-        
-        for m in messages:
+        supports_vision = _supports_vision(model)
+        mark_prefix = _uses_cache_control(model)
+
+        # Agent history only grows between turns: if this list still starts with the messages we
+        # prepared last time, reuse those dicts and only convert the new tail. This also makes
+        # retries and failovers to a model with the same capabilities free.
+        key = (id(messages), supports_vision, mark_prefix)
+        start, msg_dicts = 0, []
+        memo = self._prep_memo.get(key)
+        if memo is not None:
+            items, prepared = memo
+            if len(items) <= len(messages) and all(a is b for a, b in zip(items, messages)):
+                if len(items) == len(messages):
+                    self._prep_memo.move_to_end(key)
+                    return prepared
+                start, msg_dicts = len(items), list(prepared)
+
+        for m in islice(messages, start, None):
+            # to_dict() results are shared per message, so like plain dicts they are only copied if rewritten
             if hasattr(m, "to_dict"):
                 d = m.to_dict()
+            elif isinstance(m, dict):
+                d = m
             else:
-                d = m.copy() if isinstance(m, dict) else dict(m)
+                d = dict(m)
 
-            base64_img = d.pop("base64_image", None)
-            
-            if base64_img and supports_vision:
-                original_content = d.get("content", "")
-                d["content"] = [
-                    {"type": "text", "text": original_content},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{base64_img}"}
-                    }
-                ]
+            if "base64_image" in d:
+                base64_img = d["base64_image"]
+                d = {k: v for k, v in d.items() if k != "base64_image"}
+                if base64_img and supports_vision:
+                    d["content"] = [
+                        {"type": "text", "text": d.get("content", "")},
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": _image_data_uri(base64_img)}
+                        }
+                    ]
             msg_dicts.append(d)
+
+        if mark_prefix and msg_dicts and msg_dicts[0].get("role") == "system" and isinstance(msg_dicts[0].get("content"), str):
+            first = dict(msg_dicts[0])
+            first["content"] = cacheable_system_blocks(first["content"])
+            msg_dicts[0] = first
+
+        self._prep_memo[key] = (tuple(messages), msg_dicts)
+        self._prep_memo.move_to_end(key)
+        if len(self._prep_memo) > 8:
+            self._prep_memo.popitem(last=False)
         return msg_dicts
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=2, min=5, max=15))
-    async def ask_tool_stream(self, messages: List[Any], tools: List[dict], model: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    def _preparer(self, messages: List[Any], already_prepared: bool) -> Callable[[str], List[Dict[str, Any]]]:
+        """model -> request messages; callers passing OpenAI-shaped dicts skip preparation entirely."""
+        if already_prepared:
+            return lambda model: messages
+        return lambda model: self._prepare_messages(messages, model)
+
+    async def ask_tool_stream(self, messages: List[Any], tools: List[dict], tool_choice: str = "auto", model: Optional[str] = None, messages_already_prepared: bool = False, namespace: Any = None, semantic_query: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """Streaming tool call. `semantic_query` opts this call into the semantic cache, matched on that
+        text; pass it only when the answer depends on nothing else (e.g. a task's first turn)."""
         target_model = model or settings.MODEL_NAME
-        msg_dicts = self._prepare_messages(messages, target_model)
+        # Prepare once; retries below only repeat the network call
+        prepare = self._preparer(messages, messages_already_prepared)
+        msg_dicts = prepare(target_model)
+
+        use_cache = settings.cache.enabled and tool_choice == "auto"
+        query_vector = None
+        if use_cache:
+            cached = self.cache.get_stream(msg_dicts, tools, namespace)
+            if cached is None and self.semantic_cache is not None and semantic_query:
+                query_vector = await self.semantic_cache.embed(semantic_query)
+                cached = self.semantic_cache.get(query_vector, tools, namespace, stream=True)
+            if cached is not None:
+                for chunk in cached:
+                    yield chunk
+                    await asyncio.sleep(0)
+                return
+
+        provider, response = await self._open_tool_stream(prepare, msg_dicts, tools, tool_choice, target_model)
+        chunks: List[Any] = []
+        calls_tools = False
+        async for chunk in response:
+            # With include_usage the final chunk (empty choices) carries the token counts
+            if getattr(chunk, "usage", None):
+                self._extract_usage(chunk, provider)
+            if use_cache and not calls_tools:
+                chunks.append(chunk)
+                for choice in chunk.choices:
+                    # Tool calls have side effects, so only plain answers are replayed
+                    if choice.delta.tool_calls or choice.finish_reason == "tool_calls":
+                        calls_tools = True
+                        chunks = []
+            yield chunk
+        if use_cache and not calls_tools and chunks:
+            self.cache.set_stream(msg_dicts, chunks, tools, namespace)
+            if self.semantic_cache is not None:
+                self.semantic_cache.set(query_vector, chunks, tools, namespace, stream=True)
+
+    async def _call_with_backoff(self, client: AsyncOpenAI, **kwargs) -> Any:
+        """chat.completions.create with exponential backoff plus jitter on transient errors,
+        so a blip on a cheap provider doesn't immediately burn a more expensive backup."""
+        max_retries = settings.llm.max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                return await client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if attempt >= max_retries or not _is_transient(e):
+                    raise
+                delay = settings.llm.backoff_base * 2 ** attempt + random.uniform(0, 1)
+                logger.debug("Transient LLM error ({}), retrying in {:.1f}s", e, delay)
+                await asyncio.sleep(delay)
+
+    async def _open_tool_stream(self, prepare: Callable[[str], List[Dict[str, Any]]], msg_dicts: List[Dict[str, Any]], tools: List[dict], tool_choice: str, target_model: str) -> Tuple[str, Any]:
+        """Open a streaming completion on the primary, failing over to backups on transient errors."""
+        if settings.llm.hedge_delay > 0 and self.backup_clients:
+            attempts = self._provider_attempts(prepare, msg_dicts, target_model, tools=tools, tool_choice=tool_choice, stream=True, stream_options=_STREAM_OPTIONS)
+            return await self._hedged(attempts, settings.llm.hedge_delay)
 
         try:
-            response = await self.primary_client.chat.completions.create(
+            response = await self._call_with_backoff(
+                self.primary_client,
                 model=target_model,
                 messages=msg_dicts,
                 tools=tools,
-                tool_choice="auto",
-                stream=True
+                tool_choice=tool_choice,
+                stream=True,
+                stream_options=_STREAM_OPTIONS
             )
-            async for chunk in response:
-                yield chunk
-            return
+            return self.primary_name, response
         except Exception as e:
-            if not self.backup_clients or not any(x in str(e).lower() for x in ["429", "rate limit", "timeout", "connection"]):
+            if not self.backup_clients or not _is_transient(e):
                 raise e
-            logger.debug(f"Primary LLM failed: {e}. Starting failover sequence...")
+            logger.debug("Primary LLM failed: {}. Starting failover sequence...", e)
+            last_error = e
+
+        if settings.llm.failover_race:
+            attempts = self._provider_attempts(prepare, msg_dicts, target_model, tools=tools, tool_choice=tool_choice, stream=True, stream_options=_STREAM_OPTIONS)
+            return await self._hedged(attempts[1:], None, initial=settings.llm.failover_race_size)
 
         for b in self.backup_clients:
             try:
                 logger.info(f"Failover: Switching to {b['name']} ({b['model']})")
-                msg_dicts_backup = self._prepare_messages(messages, b['model'])
-                response = await b['client'].chat.completions.create(
+                msg_dicts_backup = prepare(b['model'])
+                response = await self._call_with_backoff(
+                    self._backup_client(b),
                     model=b['model'],
                     messages=msg_dicts_backup,
                     tools=tools,
-                    tool_choice="auto",
-                    stream=True
+                    tool_choice=tool_choice,
+                    stream=True,
+                    stream_options=_STREAM_OPTIONS
                 )
-                async for chunk in response:
-                    yield chunk
-                return
+                return b['name'], response
             except Exception as be:
                 logger.warning(f"Backup {b['name']} failed: {be}")
+                last_error = be
         
-        raise RuntimeError("All LLM providers failed.")
+        raise RuntimeError("All LLM providers failed.") from last_error
+
+    def _provider_attempts(self, prepare: Callable[[str], List[Dict[str, Any]]], msg_dicts: List[Dict[str, Any]], target_model: str, **kwargs) -> List[Tuple[str, Callable[[], Awaitable[Any]]]]:
+        """(provider name, request factory) for the primary followed by each backup, in failover order."""
+        # Each attempt keeps its own transient-error backoff, so a blip doesn't go straight to the paid backups
+        attempts = [(self.primary_name, lambda: self._call_with_backoff(self.primary_client, model=target_model, messages=msg_dicts, **kwargs))]
+        for b in self.backup_clients:
+            def attempt(b=b):
+                return self._call_with_backoff(self._backup_client(b), model=b['model'], messages=prepare(b['model']), **kwargs)
+            attempts.append((b['name'], attempt))
+        return attempts
+
+    async def _hedged(self, attempts: List[Tuple[str, Callable[[], Awaitable[Any]]]], delay: Optional[float], initial: int = 1) -> Tuple[str, Any]:
+        """Race providers: start `initial` at once, then the next whenever `delay` seconds pass
+        (never, if None) or an attempt fails without a winner."""
+        pending: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            name, factory = attempts[next_index]
+            next_index += 1
+            if next_index > 1:
+                logger.debug("Hedging: starting {}", name)
+            pending[asyncio.ensure_future(factory())] = name
 
-    async def ask_tool(self, messages: List[Any], tools: List[dict], tool_choice: str = "auto", model: Optional[str] = None) -> Any:
+        for _ in range(min(max(initial, 1), len(attempts))):
+            launch()
+        try:
+            while pending:
+                timeout = delay if next_index < len(attempts) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                winner = None
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        logger.debug("Provider {} failed: {}", name, last_error)
+                    elif winner is None:
+                        winner = (name, task.result())
+                    elif hasattr(task.result(), "close"):
+                        # Two providers answered in the same tick; release the loser's stream
+                        asyncio.ensure_future(task.result().close())
+                if winner is not None:
+                    return winner
+                if next_index < len(attempts):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise RuntimeError("All LLM providers failed.") from last_error
+
+    async def ask_tool(self, messages: List[Any], tools: List[dict], tool_choice: str = "auto", model: Optional[str] = None, messages_already_prepared: bool = False, namespace: Any = None, semantic_query: Optional[str] = None) -> Any:
+        """Non-streaming tool call. Pass a per-session namespace to get a fresh sample for a
+        prompt this session has already asked (see ResponseCache), and `semantic_query` as in
+        ask_tool_stream."""
         target_model = model or settings.MODEL_NAME
-        msg_dicts = self._prepare_messages(messages, target_model)
+        prepare = self._preparer(messages, messages_already_prepared)
+        msg_dicts = prepare(target_model)
         
         # PHASE 12: Optimized Caching
+        query_vector = None
         if settings.cache.enabled:
-            cached = self.cache.get(msg_dicts, tools)
+            cached = self.cache.get(msg_dicts, tools, namespace)
             if cached:
                 return cached
+            # Paraphrases only count as the same question when the model is free to pick tools
+            if self.semantic_cache is not None and tool_choice == "auto" and semantic_query:
+                query_vector = await self.semantic_cache.embed(semantic_query)
+                cached = self.semantic_cache.get(query_vector, tools, namespace)
+                if cached:
+                    return cached
+
+        if settings.llm.hedge_delay > 0 and self.backup_clients:
+            attempts = self._provider_attempts(prepare, msg_dicts, target_model, tools=tools, tool_choice=tool_choice, stream=False)
+            provider, response = await self._hedged(attempts, settings.llm.hedge_delay)
+            self._extract_usage(response, provider)
+            if settings.cache.enabled:
+                self._cache_response(msg_dicts, response, tools, query_vector, namespace)
+            return response
         
         try:
-            response = await self.primary_client.chat.completions.create(
+            response = await self._call_with_backoff(
+                self.primary_client,
                 model=target_model,
                 messages=msg_dicts,
                 tools=tools,
@@ -280,23 +900,32 @@ class LLM:
             self._extract_usage(response, self.primary_name)
             
             if settings.cache.enabled:
-                self.cache.set(msg_dicts, response, tools)
+                self._cache_response(msg_dicts, response, tools, query_vector, namespace)
             return response
         except Exception as e:
             # Clean up rate limit messages
             err_msg = str(e)
             if "Rate limit" in err_msg:
                 err_msg = "Rate limit reached (Summarized)"
-            logger.debug(f"Primary failed: {err_msg}")
+            logger.debug("Primary failed: {}", err_msg)
             if not self.backup_clients:
                 raise e
+
+            if settings.llm.failover_race:
+                attempts = self._provider_attempts(prepare, msg_dicts, target_model, tools=tools, tool_choice=tool_choice, stream=False)
+                provider, response = await self._hedged(attempts[1:], None, initial=settings.llm.failover_race_size)
+                self._extract_usage(response, provider)
+                if settings.cache.enabled:
+                    self._cache_response(msg_dicts, response, tools, query_vector, namespace)
+                return response
             
             # PHASE 12: Cost-Aware Failover (Clients are already added in sequence)
             for b in self.backup_clients:
                 try:
-                    logger.debug(f"🔄 Failover: Switching to {b['name']}...")
-                    msg_dicts_backup = self._prepare_messages(messages, b['model'])
-                    response = await b['client'].chat.completions.create(
+                    logger.debug("🔄 Failover: Switching to {}...", b['name'])
+                    msg_dicts_backup = prepare(b['model'])
+                    response = await self._call_with_backoff(
+                        self._backup_client(b),
                         model=b['model'],
                         messages=msg_dicts_backup,
                         tools=tools,
@@ -304,18 +933,25 @@ class LLM:
                         stream=False
                     )
                     self._extract_usage(response, b['name'])
+                    if settings.cache.enabled:
+                        self._cache_response(msg_dicts, response, tools, query_vector, namespace)
                     return response
                 except Exception as be:
-                    logger.debug(f"Backup provider {b['name']} also failed: {be}")
+                    logger.debug("Backup provider {} also failed: {}", b['name'], be)
                     continue
             raise e
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=2, min=5, max=15))
+    def _cache_response(self, msg_dicts: List[Dict[str, Any]], response: Any, tools: List[dict], query_vector=None, namespace: Any = None):
+        self.cache.set(msg_dicts, response, tools, namespace)
+        if self.semantic_cache is not None:
+            self.semantic_cache.set(query_vector, response, tools, namespace)
+
     async def quick_ask(self, messages: List[dict], model: Optional[str] = None) -> str:
         """Fast non-streaming response for simple queries (summarization, etc.)."""
         target_model = model or settings.MODEL_NAME
         try:
-            response = await self.primary_client.chat.completions.create(
+            response = await self._call_with_backoff(
+                self.primary_client,
                 model=target_model,
                 messages=messages,
                 stream=False
@@ -324,7 +960,8 @@ class LLM:
             return response.choices[0].message.content or ""
         except Exception:
             if self.backup_clients:
-                response = await self.backup_clients[0]['client'].chat.completions.create(
+                response = await self._call_with_backoff(
+                    self._backup_client(self.backup_clients[0]),
                     model=self.backup_clients[0]['model'],
                     messages=messages,
                     stream=False
@@ -340,3 +977,22 @@ class LLM:
     def save_usage(self):
         """Save usage stats to file."""
         self.usage_tracker.save()
+
+    async def flush(self):
+        """Persist usage stats and queued cache writes without blocking the event loop (call at shutdown)."""
+        self.usage_tracker.stop()
+        await self.cache.flush()
+        await self.usage_tracker.save_async()
+
+# =============================================================================
+# SHARED INSTANCE
+# =============================================================================
+
+_SHARED_LLM: Optional[LLM] = None
+
+def get_shared_llm() -> LLM:
+    """Process-wide LLM so every agent and tool shares clients, cache and usage stats."""
+    global _SHARED_LLM
+    if _SHARED_LLM is None:
+        _SHARED_LLM = LLM()
+    return _SHARED_LLM
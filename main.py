@@ -21,12 +21,46 @@ logging.getLogger("anyio").setLevel(logging.CRITICAL)
 os.environ["BROWSER_USE_LOGGING_LEVEL"] = "CRITICAL"
 
 import asyncio
+import threading
 from rich.console import Console
 from rich.panel import Panel
 
 from agent_core import ManusCompetition
+from config import settings
+from llm import LLM, close_http_clients
 from schema import Memory, Message, AgentState
 
+# Re-warm rounds while one prompt waits for input (~4 minutes at the default keepalive_expiry)
+_MAX_REWARMS = 10
+
+async def _read_input(prompt: str) -> str:
+    """input() on a daemon thread, so the loop keeps running while the user types and Ctrl+C
+    doesn't leave interpreter exit waiting on a pool worker blocked in input()."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result=None, error=None):
+        if not future.done():
+            future.set_exception(error) if error is not None else future.set_result(result)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, None, e)
+        else:
+            loop.call_soon_threadsafe(settle, line)
+
+    threading.Thread(target=read, name="user-input", daemon=True).start()
+    return await future
+
+async def _keep_warm(llm: LLM):
+    """Keep provider connections warm while waiting for input; the pool drops idle ones after keepalive_expiry."""
+    interval = max(settings.llm.keepalive_expiry - 5.0, 5.0)
+    for _ in range(_MAX_REWARMS):
+        await llm.prewarm()
+        await asyncio.sleep(interval)
+
 async def main():
     console = Console()
     console.print(Panel.fit(
@@ -40,13 +74,19 @@ async def main():
 
     # Initialize Agent (Now handles its own Memory and System Prompt internally)
     agent = ManusCompetition()
-    
+
     print("\nReady! type 'exit' to quit.\n")
 
+    warm_task = None
     try:
         while True:
             try:
-                user_input = input("\nUser: ").strip()
+                # Open provider connections in the background while the user types the task
+                warm_task = asyncio.create_task(_keep_warm(agent.llm))
+                try:
+                    user_input = (await _read_input("\nUser: ")).strip()
+                finally:
+                    warm_task.cancel()
                 if not user_input:
                     continue
                 if user_input.lower() in ["exit", "quit", "q"]:
@@ -72,15 +112,18 @@ async def main():
                 agent.state = AgentState.IDLE
                 agent.final_answer = None
                 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 break
             except Exception as e:
                 logger.error(f"Runtime Error: {e}")
                 
     finally:
+        if warm_task is not None:
+            warm_task.cancel()
+
         # Save usage stats
-        if hasattr(agent, 'llm') and hasattr(agent.llm, 'save_usage'):
-            agent.llm.save_usage()
+        if hasattr(agent, 'llm') and hasattr(agent.llm, 'flush'):
+            await agent.llm.flush()
             console.print(f"\n[dim]{agent.llm.get_usage_summary()}[/dim]")
         
         # Cleanup any active tools (like browser)
@@ -88,10 +131,19 @@ async def main():
             browser_tool = agent.available_tools.get_tool("browser_use")
             if browser_tool and hasattr(browser_tool, "cleanup"):
                 await browser_tool.cleanup()
+
+        await close_http_clients()
         
         print("\nGoodbye!")
 
 if __name__ == "__main__":
+    # uvloop cuts per-await overhead on the streaming path; it isn't available on Windows
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, asyncio.CancelledError):
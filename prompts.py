@@ -3,13 +3,19 @@ Centralized prompt templates for Manus-Cu-Sen-Core.
 Supports Chain-of-Thought (CoT) reasoning and adaptive complexity.
 """
 
+import functools
 import os
+import re
+from typing import List
+
+# Frozen at import so the system prompt is byte-identical across turns (keeps provider prefix caches warm)
+_WORKING_DIRECTORY = os.getcwd()
 
 # =============================================================================
 # CORE SYSTEM PROMPT (V2 - Enhanced Reasoning)
 # =============================================================================
 
-SYSTEM_PROMPT_V2 = """You are Manus-Cu-Sen, an advanced AI assistant with FULL AUTONOMOUS EXECUTION capabilities.
+SYSTEM_PROMPT_STATIC_PREFIX = """You are Manus-Cu-Sen, an advanced AI assistant with FULL AUTONOMOUS EXECUTION capabilities.
 You solve complex tasks by combining structured thinking with specialized tools AND direct system commands.
 
 > [IMPORTANT]
@@ -33,9 +39,15 @@ SYSTEM GUIDELINES:
 4. **Language Policy**: Match the user's language in all outputs.
 5. **WORKSPACE (WINDOWS)**: Save ALL files in `outputs/`.
 
-Current working directory: {directory}
 """
 
+# Kept out of the static prefix above so the prompt-cache breakpoint covers only text that is
+# the same on every machine and run (see cacheable_system_blocks)
+SYSTEM_PROMPT_DYNAMIC_SUFFIX = """Current working directory: {directory}
+"""
+
+SYSTEM_PROMPT_V2 = SYSTEM_PROMPT_STATIC_PREFIX + SYSTEM_PROMPT_DYNAMIC_SUFFIX
+
 # =============================================================================
 # CHAIN-OF-THOUGHT REASONING PROMPTS
 # =============================================================================
@@ -179,27 +191,41 @@ COMPLEXITY_KEYWORDS = [
     "integrate", "deploy", "configure", "setup"
 ]
 
+# Complexity keywords (any case) or multi-part separators (as written), found in one regex scan
+_COMPLEXITY_RE = re.compile(
+    "(?i:" + "|".join(map(re.escape, COMPLEXITY_KEYWORDS)) + r")|[,;]|\b(?:và|and|then|sau đó)\b"
+)
+
 def is_complex_task(user_input: str) -> bool:
     """Determine if a task requires detailed reasoning."""
-    user_lower = user_input.lower()
-    
-    # Check for complexity indicators
-    keyword_match = any(kw in user_lower for kw in COMPLEXITY_KEYWORDS)
-    is_long = len(user_input.split()) > 15
-    has_multiple_parts = any(sep in user_input for sep in ["và", "and", ",", ";", "then", "sau đó"])
-    
-    return keyword_match or is_long or has_multiple_parts
+    # Check for complexity indicators, then length
+    return _COMPLEXITY_RE.search(user_input) is not None or len(user_input.split()) > 15
 
 
+@functools.lru_cache(maxsize=32)
 def get_system_prompt(max_steps: int = 20, tool_instructions: str = "") -> str:
     """Get the enhanced system prompt with current directory and max_steps."""
     return SYSTEM_PROMPT_V2.format(
-        directory=os.getcwd(), 
+        directory=_WORKING_DIRECTORY, 
         max_steps=max_steps,
         tool_instructions=tool_instructions
     )
 
 
+_DYNAMIC_SUFFIX_START = SYSTEM_PROMPT_DYNAMIC_SUFFIX.split("{", 1)[0]
+
+def cacheable_system_blocks(system_prompt: str) -> List[dict]:
+    """Content blocks for a system prompt with an Anthropic cache_control breakpoint after the
+    static prefix; prompts without the dynamic suffix are marked as a whole."""
+    static, sep, dynamic = system_prompt.rpartition(_DYNAMIC_SUFFIX_START)
+    if not sep or not static:
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    return [
+        {"type": "text", "text": static, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": sep + dynamic},
+    ]
+
+
 def get_reasoning_prompt(is_complex: bool = False) -> str:
     """Get appropriate reasoning prompt based on task complexity."""
     if is_complex:
@@ -207,13 +233,17 @@ def get_reasoning_prompt(is_complex: bool = False) -> str:
     return NEXT_STEP_PROMPT_SIMPLE
 
 
+_QUICK_REFLECTION_HEAD, _QUICK_REFLECTION_TAIL = QUICK_REFLECTION_PROMPT.split("{result}")
+
 def get_reflection_prompt(is_complex: bool = False, result: str = "") -> str:
     """Get appropriate reflection prompt based on task complexity."""
     if is_complex:
         return SELF_REFLECTION_PROMPT
-    return QUICK_REFLECTION_PROMPT.format(result=result[:200])
+    return f"{_QUICK_REFLECTION_HEAD}{result[:200]}{_QUICK_REFLECTION_TAIL}"
+
 
+_FALLBACK_PROMPT = EXECUTION_FALLBACK_PROMPT + "\n" + TERMINAL_GUIDANCE_PROMPT
 
 def get_fallback_prompt() -> str:
     """Get the terminal fallback prompt when tools fail."""
-    return EXECUTION_FALLBACK_PROMPT + "\n" + TERMINAL_GUIDANCE_PROMPT
+    return _FALLBACK_PROMPT
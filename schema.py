@@ -1,6 +1,32 @@
+import functools
+import re
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union, Dict
-from pydantic import BaseModel, Field
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, List, Literal, Optional, Union, Dict
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+
+# Chat-template control tokens that models sometimes echo back (Llama 3, ChatML, Llama 2).
+# Only the Llama 3 / ChatML family (<|eot_id|>, <|im_start|>, <|start_header_id|>, ...) needs a
+# regex. No lazy .*?: the token body is a character class that cannot contain "|" or whitespace, so
+# each "<|" is matched or rejected after reading one word (linear even on "<|" * 10_000), and pipe
+# operators in code ("a <| b |> c") are left alone.
+_TEMPLATE_TOKEN_RE = re.compile(r"<\|[^|\s]*\|>")
+
+def sanitize_content(text: Optional[str]) -> Optional[str]:
+    """Strip leaked control tokens from LLM output or tool results."""
+    if not text:
+        return text
+    # Each family is only touched when its stem is present (plain "<" and "[" are common in code
+    # and markdown); the Llama 2 markers are fixed strings, so str.replace beats the regex engine
+    if "<|" in text:
+        text = _TEMPLATE_TOKEN_RE.sub("", text)
+    if "INST]" in text:
+        text = text.replace("[INST]", "").replace("[/INST]", "")
+    if "SYS>>" in text:
+        text = text.replace("<<SYS>>", "").replace("<</SYS>>", "")
+    return text
 
 class Role(str, Enum):
     SYSTEM = "system"
@@ -20,57 +46,126 @@ class ToolChoice(str, Enum):
     AUTO = "auto"
     REQUIRED = "required"
 
-class Function(BaseModel):
+# Tool calls are plain slotted records: the agent builds them from streamed deltas it has
+# already checked, so they skip pydantic validation and per-instance __dict__s
+@dataclass(slots=True, frozen=True)
+class Function:
     name: str
     arguments: str
 
-class ToolCall(BaseModel):
+@dataclass(slots=True, frozen=True)
+class ToolCall:
     id: str
-    type: str = "function"
     function: Function
+    type: str = "function"
 
 class Message(BaseModel):
+    # Always a Role member (validation coerces strings; the factories pass members), so it can be compared with `is`
     role: Role
     content: Optional[str] = None
     tool_calls: Optional[List[ToolCall]] = None
     name: Optional[str] = None
     tool_call_id: Optional[str] = None
     base64_image: Optional[str] = None
+    _cached_dict: Optional[dict] = PrivateAttr(default=None)
+
+    # Messages are immutable once built, which is what makes caching to_dict() safe
+    model_config = ConfigDict(frozen=True, extra="forbid")
 
     def to_dict(self) -> dict:
-        msg = {"role": self.role.value if isinstance(self.role, Role) else self.role}
-        if self.content is not None: msg["content"] = self.content
-        if self.tool_calls: msg["tool_calls"] = [tc.model_dump() for tc in self.tool_calls]
-        if self.name: msg["name"] = self.name
-        if self.tool_call_id: msg["tool_call_id"] = self.tool_call_id
-        if self.base64_image: msg["base64_image"] = self.base64_image
-        return msg
+        """OpenAI-shaped dict, built once per message and shared between calls: do not mutate it."""
+        if self._cached_dict is None:
+            self._cached_dict = _SERIALIZERS[self.role](self)
+        return self._cached_dict
 
+    # The factories below are the hot path and their arguments are already the right types,
+    # so they use model_construct to skip validation
     @classmethod
     def user_message(cls, content: str, base64_image: Optional[str] = None) -> "Message":
-        return cls(role=Role.USER, content=content, base64_image=base64_image)
+        if base64_image is None and _is_shareable(content):
+            return _shared_message(cls, Role.USER, content)
+        return cls.model_construct(role=Role.USER, content=content, base64_image=base64_image)
 
     @classmethod
     def system_message(cls, content: str) -> "Message":
-        return cls(role=Role.SYSTEM, content=content)
+        if _is_shareable(content):
+            return _shared_message(cls, Role.SYSTEM, content)
+        return cls.model_construct(role=Role.SYSTEM, content=content)
 
     @classmethod
     def assistant_message(cls, content: Optional[str] = None, tool_calls: Optional[List[ToolCall]] = None) -> "Message":
-        return cls(role=Role.ASSISTANT, content=content, tool_calls=tool_calls)
+        return cls.model_construct(role=Role.ASSISTANT, content=content, tool_calls=tool_calls)
 
     @classmethod
-    def tool_message(cls, content: str, name: str, tool_call_id: str) -> "Message":
-        return cls(role=Role.TOOL, content=content, name=name, tool_call_id=tool_call_id)
+    def tool_message(cls, content: str, name: str, tool_call_id: str, base64_image: Optional[str] = None) -> "Message":
+        return cls.model_construct(
+            role=Role.TOOL, content=content, name=name, tool_call_id=tool_call_id, base64_image=base64_image
+        )
+
+# The agent re-sends the same step prompt every turn; messages are frozen, so identical short
+# user/system messages can share one instance (and its cached to_dict())
+_SHARED_MESSAGE_MAX_CHARS = 2048
+
+def _is_shareable(content: Any) -> bool:
+    return type(content) is str and len(content) <= _SHARED_MESSAGE_MAX_CHARS
+
+@functools.lru_cache(maxsize=128)
+def _shared_message(cls: type, role: Role, content: str) -> Message:
+    return cls.model_construct(role=role, content=content)
+
+# Per-role serializers for Message.to_dict: each one only looks at the fields its role can carry
+def _content_dict(role: str, m: Message) -> dict:
+    return {"role": role} if m.content is None else {"role": role, "content": m.content}
+
+def _ser_system(m: Message) -> dict:
+    return _content_dict("system", m)
+
+def _ser_user(m: Message) -> dict:
+    msg = _content_dict("user", m)
+    if m.base64_image: msg["base64_image"] = m.base64_image
+    return msg
+
+def _ser_assistant(m: Message) -> dict:
+    msg = _content_dict("assistant", m)
+    if m.tool_calls: msg["tool_calls"] = [
+        {"id": tc.id, "type": tc.type, "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+        for tc in m.tool_calls
+    ]
+    return msg
+
+def _ser_tool(m: Message) -> dict:
+    msg = _content_dict("tool", m)
+    if m.name: msg["name"] = m.name
+    if m.tool_call_id: msg["tool_call_id"] = m.tool_call_id
+    if m.base64_image: msg["base64_image"] = m.base64_image
+    return msg
+
+_SERIALIZERS = {Role.SYSTEM: _ser_system, Role.USER: _ser_user, Role.ASSISTANT: _ser_assistant, Role.TOOL: _ser_tool}
+
+def _summary_line(m: Message) -> str:
+    """One line of summarize() input; tool-only turns keep the names of the tools they called."""
+    text = m.content[:500] if m.content else ""
+    if m.tool_calls:
+        text = ("%s [tools: %s]" % (text, ", ".join(tc.function.name for tc in m.tool_calls))).lstrip()
+    return "%s: %s" % (m.role.value, text) if text else ""
 
 class Memory(BaseModel):
-    messages: List[Message] = Field(default_factory=list)
+    # A bounded deque: appending past max_messages drops the oldest entry in O(1)
+    messages: Deque[Message] = Field(default_factory=deque)
     max_messages: int = 100
     _summary_threshold: int = 20
 
+    def model_post_init(self, __context: Any):
+        self.messages = deque(self.messages, maxlen=self.max_messages)
+
     def add_message(self, message: Message):
-        self.messages.append(message)
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages:]
+        messages = self.messages
+        if len(messages) == messages.maxlen > 1 and messages[0].role is Role.SYSTEM:
+            # Evict the oldest turn instead of the system prompt (still O(1) on a deque)
+            system = messages.popleft()
+            messages.popleft()
+            messages.appendleft(system)
+        messages.append(message)
 
     async def summarize(self, llm: Any):
         """Summarize old messages to save tokens if history is too long."""
@@ -87,12 +182,12 @@ class Memory(BaseModel):
         from loguru import logger
         logger.debug(f"🧠 Performance: Optimizing context ({num_to_summarize} messages)...")
         
-        system_prompt = self.messages[0] if self.messages[0].role == Role.SYSTEM else None
+        system_prompt = self.messages[0] if self.messages[0].role is Role.SYSTEM else None
         start_idx = 1 if system_prompt else 0
-        to_summarize = self.messages[start_idx : start_idx + num_to_summarize]
+        to_summarize = list(islice(self.messages, start_idx, start_idx + num_to_summarize))
         
         # Format for LLM
-        summary_input = "\n".join([f"{m.role}: {m.content[:500]}" for m in to_summarize if m.content])
+        summary_input = "\n".join(filter(None, map(_summary_line, to_summarize)))
         prompt = f"Please provide a concise summary of the following conversation history. Focus on: 1. The original goal. 2. Key findings/data. 3. Current status. \n\n{summary_input}"
         
         try:
@@ -106,9 +201,9 @@ class Memory(BaseModel):
                 if system_prompt:
                     new_messages.append(system_prompt)
                 new_messages.append(summary_msg)
-                new_messages.extend(self.messages[start_idx + num_to_summarize:])
+                new_messages.extend(islice(self.messages, start_idx + num_to_summarize, None))
                 
-                self.messages = new_messages
+                self.messages = deque(new_messages, maxlen=self.max_messages)
                 logger.debug("✅ Context optimized.")
         except Exception as e:
             logger.warning(f"Failed to summarize context: {e}")
@@ -1,37 +1,57 @@
-import os
 import importlib
 import inspect
+import pkgutil
+from typing import List, Optional, Tuple
 from loguru import logger
 from base_tool import BaseTool
 
+# (module name, class) for every concrete tool, discovered once per process
+_TOOL_CLASSES: Optional[List[Tuple[str, type]]] = None
+
+def _discover_tool_classes() -> List[Tuple[str, type]]:
+    global _TOOL_CLASSES
+    if _TOOL_CLASSES is None:
+        loaded = set()
+        for module_info in pkgutil.iter_modules(__path__):
+            module_name = f"tools.{module_info.name}"
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                logger.error(f"Failed to load tool from {module_name}: {e}")
+                continue
+            loaded.add(module_name)
+        # Importing registered every tool class on BaseTool; walk that tree instead of every module attribute
+        found, pending = [], list(BaseTool.__subclasses__())
+        while pending:
+            cls = pending.pop(0)
+            pending.extend(cls.__subclasses__())
+            if cls.__module__ in loaded and not inspect.isabstract(cls):
+                found.append((cls.__module__, cls))
+        _TOOL_CLASSES = found
+    return _TOOL_CLASSES
+
+def _declared_name(cls: type) -> Optional[str]:
+    field = cls.model_fields.get("name")
+    return None if field is None or field.is_required() else field.default
+
 def load_tools(enabled_tools: list = None):
     """
     Dynamically loads tool classes from the current directory.
     Only loads classes that inherit from BaseTool and are not BaseTool itself.
     """
     tools = []
-    current_dir = os.path.dirname(__file__)
-    
-    for filename in os.listdir(current_dir):
-        if filename.endswith(".py") and filename != "__init__.py":
-            module_name = f"tools.{filename[:-3]}"
-            try:
-                module = importlib.import_module(module_name)
-                for name, obj in inspect.getmembers(module):
-                    if (inspect.isclass(obj) and 
-                        issubclass(obj, BaseTool) and 
-                        obj is not BaseTool):
-                        
-                        instance = obj()
-                        # If enabled_tools is provided, filter by tool name
-                        if enabled_tools is not None:
-                            if instance.name in enabled_tools:
-                                tools.append(instance)
-                                logger.debug(f"Loaded tool: {instance.name} from {module_name}")
-                        else:
-                            tools.append(instance)
-                            logger.debug(f"Loaded tool: {instance.name} from {module_name}")
-            except Exception as e:
-                logger.error(f"Failed to load tool from {module_name}: {e}")
-                
+    for module_name, cls in _discover_tool_classes():
+        # Skip disabled tools before paying for their construction
+        declared = _declared_name(cls)
+        if enabled_tools is not None and declared is not None and declared not in enabled_tools:
+            continue
+        try:
+            instance = cls()
+        except Exception as e:
+            logger.error(f"Failed to load tool from {module_name}: {e}")
+            continue
+        # If enabled_tools is provided, filter by tool name
+        if enabled_tools is None or instance.name in enabled_tools:
+            tools.append(instance)
+            logger.debug(f"Loaded tool: {instance.name} from {module_name}")
     return tools
@@ -1,9 +1,16 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from base_tool import BaseTool
 
+# Questions are asked one at a time, so one long-lived thread serves every input() call
+# instead of borrowing a worker from the loop's shared default pool.
+_INPUT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ask-human")
+_ANSWER_PROMPT = "\033[1;32mTRA LOI CUA BAN:\033[0m "
+
 class AskHumanTool(BaseTool):
     name: str = "ask_human"
+    parallel_safe: bool = False
     description: str = "Ask the human user for clarification, permission, or help when you are stuck or need specific information."
     parameters: dict = {
         "type": "object",
@@ -19,6 +26,6 @@ class AskHumanTool(BaseTool):
     async def execute(self, question: str) -> str:
         # Styled output for CLI
         print(f"\n\033[1;35mCAU HOI TU AI:\033[0m \033[35m{question}\033[0m")
-        # Since we are in an async loop, we use to_thread to keep input() from blocking the whole event loop
-        response = await asyncio.to_thread(input, "\033[1;32mTRA LOI CUA BAN:\033[0m ")
+        # Run input() off the event loop so it doesn't block the whole agent
+        response = await asyncio.get_running_loop().run_in_executor(_INPUT_EXECUTOR, input, _ANSWER_PROMPT)
         return response
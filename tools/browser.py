@@ -2,18 +2,122 @@ import asyncio
 import base64
 import json
 import os
-from typing import Optional, Dict, Any, List
+import re
+import time
+from typing import Any, ClassVar, Dict, List, Optional
+from urllib.parse import urljoin
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 from base_tool import BaseTool
-from agent_core import LLM
+from llm import LLM, get_shared_llm
 from config import settings
 from loguru import logger
-import markdownify
+import lxml.html
+from lxml import etree
 from event_bus import EventBus
 
+# Page text for the `extract` action. A single lxml walk that stops once enough text has been
+# produced: pages can be megabytes of HTML and the agent only ever sees the first 10k characters.
+_EXTRACT_LIMIT = 10000
+_SKIP_TAGS = frozenset({"head", "script", "style", "noscript", "template", "svg", "iframe"})
+_HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+_BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset", "figcaption",
+    "figure", "footer", "form", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section",
+    "table", "tr", "ul", *_HEADING_LEVELS,
+})
+_WHITESPACE_RE = re.compile(r"\s+")
+_BLANK_LINES_RE = re.compile(r"\n(?: *\n)+")
+
+def _page_text(html: str, limit: int = _EXTRACT_LIMIT, base_url: str = "") -> str:
+    """Readable page text with ATX headings, list bullets and [text](url) links, built from at most
+    ~`limit` characters. Relative links are resolved against `base_url`."""
+    try:
+        # Bytes, so documents that carry an XML encoding declaration still parse
+        root = lxml.html.fromstring(html.encode("utf-8"))
+    except (etree.ParserError, ValueError):
+        return ""
+    parts: List[str] = []
+    size = 0
+    skipping = 0
+    links: List[Optional[str]] = []  # target of each open <a>, None if it isn't rendered as a link
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        tag = el.tag if isinstance(el.tag, str) else None  # comments and processing instructions
+        if event == "start":
+            if tag in _SKIP_TAGS:
+                skipping += 1
+            if skipping or tag is None:
+                continue
+            if tag in _HEADING_LEVELS:
+                parts.append("\n" + "#" * _HEADING_LEVELS[tag] + " ")
+            elif tag == "li":
+                parts.append("\n- ")
+            elif tag in _BLOCK_TAGS:
+                parts.append("\n")
+            elif tag == "a":
+                # The agent navigates by these, so keep the targets markdownify used to emit
+                href = (el.get("href") or "").strip()
+                href = urljoin(base_url, href) if href and not href.startswith(("#", "javascript:")) else None
+                links.append(href)
+                if href:
+                    parts.append("[")
+            text = el.text
+        else:
+            if tag in _SKIP_TAGS:
+                skipping -= 1
+            elif skipping:
+                continue
+            elif tag in _BLOCK_TAGS and tag != "li":  # keep list items on consecutive lines
+                parts.append("\n")
+            elif tag == "a":
+                href = links.pop()
+                if href:
+                    parts.append(f"]({href})")
+                    size += len(href)
+            text = el.tail
+        if text and not skipping:
+            text = _WHITESPACE_RE.sub(" ", text[:limit - size])
+            parts.append(text)
+            size += len(text)
+            if size >= limit:
+                break
+    return _BLANK_LINES_RE.sub("\n\n", "".join(parts).replace("\n ", "\n")).strip()
+
+# One Chromium per process (or an external one over CDP, shared between processes). Each BrowserTool,
+# i.e. each agent, gets its own context and tab on it, so agents don't queue behind one page and
+# don't each pay for a browser launch.
+_SHARED_PLAYWRIGHT = None
+_SHARED_BROWSER: Optional[Browser] = None
+_BROWSER_LOCK = asyncio.Lock()
+
+async def _get_shared_browser() -> Browser:
+    global _SHARED_PLAYWRIGHT, _SHARED_BROWSER
+    async with _BROWSER_LOCK:
+        if _SHARED_BROWSER is None or not _SHARED_BROWSER.is_connected():
+            if _SHARED_PLAYWRIGHT is None:
+                _SHARED_PLAYWRIGHT = await async_playwright().start()
+            if settings.tools.browser_cdp_url:
+                _SHARED_BROWSER = await _SHARED_PLAYWRIGHT.chromium.connect_over_cdp(settings.tools.browser_cdp_url)
+            else:
+                _SHARED_BROWSER = await _SHARED_PLAYWRIGHT.chromium.launch(headless=False)
+    return _SHARED_BROWSER
+
+async def _close_shared_browser_if_idle():
+    """Shut the shared browser down once no BrowserTool holds a context on it."""
+    global _SHARED_PLAYWRIGHT, _SHARED_BROWSER
+    async with _BROWSER_LOCK:
+        if _SHARED_BROWSER is not None and _SHARED_BROWSER.is_connected() and _SHARED_BROWSER.contexts:
+            return
+        if _SHARED_BROWSER is not None:
+            await _SHARED_BROWSER.close()
+            _SHARED_BROWSER = None
+        if _SHARED_PLAYWRIGHT is not None:
+            await _SHARED_PLAYWRIGHT.stop()
+            _SHARED_PLAYWRIGHT = None
+
 
 class BrowserTool(BaseTool):
     name: str = "browser"
+    parallel_safe: bool = False
     description: str = """A powerful browser tool. 
     MANDATORY for interaction: Use action='step' with your goal in 'text' parameter. 
     The 'step' action uses a specialized Maverick Vision model to handle clicks/types perfectly.
@@ -36,21 +140,26 @@ class BrowserTool(BaseTool):
         "required": ["action"]
     }
 
-    _playwright = None
     _browser: Optional[Browser] = None
     _context: Optional[BrowserContext] = None
     _page: Optional[Page] = None
+    _view_task: Optional[asyncio.Task] = None
+    _idle_task: Optional[asyncio.Task] = None
+    _last_view_at: float = 0.0
+    _dom_cache: Optional[List[Dict[str, Any]]] = None
+    _dom_cache_url: Optional[str] = None
     _llm: Optional[LLM] = None
 
     class Config:
         arbitrary_types_allowed = True
 
     async def _init_browser(self):
-        if not self._playwright:
-            self._playwright = await async_playwright().start()
-        if not self._browser:
-            self._browser = await self._playwright.chromium.launch(headless=False)
-            self._context = await self._browser.new_context(
+        browser = await _get_shared_browser()
+        if not self._context or self._browser is not browser:
+            # First use, or the shared browser was relaunched under us
+            self._browser = browser
+            self._page = None
+            self._context = await browser.new_context(
                 viewport={"width": 1280, "height": 720},
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
             )
@@ -58,10 +167,11 @@ class BrowserTool(BaseTool):
             self._page = await self._context.new_page()
         
         if not self._llm:
-            self._llm = LLM()
+            self._llm = get_shared_llm()
 
     async def execute(self, action: str, url: Optional[str] = None, selector: Optional[str] = None, 
                       text: Optional[str] = None, direction: str = "down", index: Optional[int] = None) -> str:
+        self._cancel_idle_close()
         await self._init_browser()
         
         try:
@@ -78,7 +188,7 @@ class BrowserTool(BaseTool):
                 
                 # Small human-like pause
                 await asyncio.sleep(1)
-                await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                self._schedule_view()
                 return f"Navigated to {url}. Title: {await self._page.title()}"
 
 
@@ -86,8 +196,9 @@ class BrowserTool(BaseTool):
                 if not text: return "Error: Goal text required for 'step' action."
                 
                 # Vision-Specialist Step (Maverick)
-                screenshot = await self.get_screenshot_base64()
-                dom = await self.get_simplified_dom()
+                # Labelling and DOM extraction only read the page, so their round trips overlap
+                _, dom = await asyncio.gather(self._inject_labels(), self.get_simplified_dom())
+                screenshot = await self._raw_screenshot()
                 
                 prompt = f"""You are a Browser Vision Specialist. Your goal is: {text}
                 Current URL: {self._page.url}
@@ -119,26 +230,26 @@ class BrowserTool(BaseTool):
                 
                 if mv_action == "click":
                     await self._page.click(mv_selector, timeout=10000)
-                    await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                    self._schedule_view()
                     return f"Maverick Action: Clicked {mv_selector}. Reason: {decision.get('reason')}"
                 elif mv_action == "type":
                     await self._page.fill(mv_selector, mv_text, timeout=10000)
-                    await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                    self._schedule_view()
                     return f"Maverick Action: Typed into {mv_selector}. Reason: {decision.get('reason')}"
                 elif mv_action == "scroll":
                     await self._page.evaluate("window.scrollBy(0, 600)")
-                    await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                    self._schedule_view()
                     return "Maverick Action: Scrolled down."
                 elif mv_action == "done":
                     return f"Maverick reports goal completed: {decision.get('reason')}"
                 
-                await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                # Nothing was done, so the screenshot taken for the decision is still current
+                self._schedule_view(screenshot)
                 return f"Maverick decided unknown action: {mv_action}"
 
 
             if action == "close":
-                await self._browser.close()
-                self._browser = None
+                await self._close_context()
                 return "Browser closed."
 
             if not self._page or self._page.url == "about:blank":
@@ -161,10 +272,10 @@ class BrowserTool(BaseTool):
                 # Ensure we wait a bit for dynamic content
                 await asyncio.sleep(2)
                 content = await self._page.content()
-                md = markdownify.markdownify(content, heading_style="ATX")
+                md = _page_text(content, base_url=self._page.url)
                 # Remove extra noise from common lyric sites
                 clean_md = md.replace("\n\n\n", "\n").replace("Toggle navigation", "")
-                return f"URL: {self._page.url}\nCONTENT:\n{clean_md[:10000]}"
+                return f"URL: {self._page.url}\nCONTENT:\n{clean_md[:_EXTRACT_LIMIT]}"
 
             # Manual override interactions (click, type)
             # Manual override interactions (click, type, or by index)
@@ -177,7 +288,7 @@ class BrowserTool(BaseTool):
                             if (el) el.click();
                         }}
                     """)
-                    await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                    self._schedule_view()
                     return f"Clicked element at index {index}."
                 
                 if not selector: return "Error: Selector, text or index required."
@@ -188,7 +299,7 @@ class BrowserTool(BaseTool):
                         await self._page.get_by_text(selector).first.click(timeout=5000)
                     except:
                         await self._page.get_by_role("button", name=selector).first.click(timeout=5000)
-                await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                self._schedule_view()
                 return f"Clicked '{selector}'."
 
             if action == "type":
@@ -206,7 +317,7 @@ class BrowserTool(BaseTool):
                             }}
                         }}
                     """)
-                    await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                    self._schedule_view()
                     return f"Typed '{text}' into element at index {index}."
 
                 if not selector: return "Error: Selector or index required."
@@ -217,7 +328,7 @@ class BrowserTool(BaseTool):
                         await self._page.locator(f'input[name="{selector}"], textarea[name="{selector}"]').first.fill(text, timeout=5000)
                     except:
                         await self._page.get_by_placeholder(selector).first.fill(text, timeout=5000)
-                await EventBus.publish("browser_view", await self.get_screenshot_base64())
+                self._schedule_view()
                 return f"Typed '{text}' into '{selector}'."
 
             return f"Error: Unknown action {action}"
@@ -225,10 +336,60 @@ class BrowserTool(BaseTool):
         except Exception as e:
             logger.error(f"BrowserTool Error: {e}")
             return f"Error: {str(e)}"
+        finally:
+            self._schedule_idle_close()
+
+    def _schedule_idle_close(self):
+        """Release the context if no action follows within browser_idle_timeout seconds."""
+        timeout = settings.tools.browser_idle_timeout
+        if timeout > 0:
+            self._idle_task = asyncio.create_task(self._close_when_idle(timeout))
+
+    def _cancel_idle_close(self):
+        if self._idle_task is not None and self._idle_task is not asyncio.current_task():
+            self._idle_task.cancel()
+        self._idle_task = None
+
+    async def _close_when_idle(self, timeout: float):
+        await asyncio.sleep(timeout)
+        logger.debug(f"Closing browser context after {timeout:.0f}s idle")
+        await self.cleanup()
+
+    VIEW_DEBOUNCE: ClassVar[float] = 0.2
+
+    def _schedule_view(self, screenshot: Optional[str] = None):
+        """Publish the page to the UI in the background, at most once per VIEW_DEBOUNCE seconds.
+
+        The action result returns without waiting for a capture, and a burst of actions collapses
+        into one trailing screenshot of the latest state. Nothing is captured without a listener.
+        """
+        if not EventBus.has_listeners():
+            return
+        if self._view_task is not None and not self._view_task.done():
+            return  # The pending publish captures after this action anyway
+        self._view_task = asyncio.create_task(self._publish_view(screenshot))
+
+    async def _publish_view(self, screenshot: Optional[str]):
+        wait = self.VIEW_DEBOUNCE - (time.monotonic() - self._last_view_at)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            screenshot = None  # The page may have changed while we waited
+        try:
+            await EventBus.publish("browser_view", screenshot or await self.get_screenshot_base64())
+        except Exception as e:
+            logger.debug(f"Skipped browser view update: {e}")
+        finally:
+            self._last_view_at = time.monotonic()
 
     async def get_screenshot_base64(self) -> str:
         if not self._page: return ""
         # Inject highlighting labels before screenshot
+        await self._inject_labels()
+        return await self._raw_screenshot()
+
+    async def _inject_labels(self):
+        """Overlay each interactive element's index, matching get_simplified_dom's numbering."""
+        if not self._page: return
         await self._page.evaluate("""
             () => {
                 // Remove old labels
@@ -255,15 +416,36 @@ class BrowserTool(BaseTool):
                 });
             }
         """)
-        
+
+    async def _raw_screenshot(self) -> str:
+        if not self._page: return ""
         screenshot = await self._page.screenshot(type="jpeg", quality=60) # Compressed for cost
         return base64.b64encode(screenshot).decode('utf-8')
 
     async def get_simplified_dom(self) -> List[Dict[str, Any]]:
         """Simplified DOM for optimized browser control"""
         if not self._page: return []
+        # A MutationObserver (ignoring our own index labels) marks the page dirty; while it is clean
+        # and unscrolled the script returns null and the last extraction is reused
+        force = self._dom_cache is None or self._dom_cache_url != self._page.url
         elements = await self._page.evaluate("""
-            () => {
+            (force) => {
+                const scroll = window.scrollX + ',' + window.scrollY;
+                if (!force && window.__manusDomClean && window.__manusDomScroll === scroll) return null;
+                if (!window.__manusDomObserver) {
+                    const isLabel = n => n.classList && n.classList.contains('manus-label');
+                    window.__manusDomObserver = new MutationObserver(records => {
+                        if (records.some(r => !isLabel(r.target) &&
+                                !(r.type === 'childList' && [...r.addedNodes, ...r.removedNodes].every(isLabel)))) {
+                            window.__manusDomClean = false;
+                        }
+                    });
+                    window.__manusDomObserver.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+                    // Typing changes .value, which is a property and never shows up as a mutation
+                    document.addEventListener('input', () => { window.__manusDomClean = false; }, true);
+                }
+                window.__manusDomClean = true;
+                window.__manusDomScroll = scroll;
                 const interactives = Array.from(document.querySelectorAll('button, a, input, select, textarea, [role="button"]'));
                 return interactives.map((el, i) => {
                     const rect = el.getBoundingClientRect();
@@ -275,14 +457,27 @@ class BrowserTool(BaseTool):
                     };
                 }).filter(el => el.visible && (el.text.length > 0 || el.tag === 'INPUT')).slice(0, 60);
             }
-        """)
+        """, force)
+        if elements is None:
+            return self._dom_cache
+        self._dom_cache, self._dom_cache_url = elements, self._page.url
         return elements
 
+    async def _close_context(self):
+        """Close this tool's context and tab; the shared browser stays up for other agents."""
+        self._cancel_idle_close()
+        if self._view_task is not None:
+            self._view_task.cancel()
+            self._view_task = None
+        # Detach before awaiting, so an action starting meanwhile opens a fresh context
+        context, self._context, self._page, self._browser = self._context, None, None, None
+        if context:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.debug(f"Browser context already closed: {e}")
+
     async def cleanup(self):
         """Clean up browser resources."""
-        if self._browser:
-            await self._browser.close()
-            self._browser = None
-        if self._playwright:
-            await self._playwright.stop()
-            self._playwright = None
+        await self._close_context()
+        await _close_shared_browser_if_idle()
@@ -11,7 +11,7 @@ from pydantic import Field, field_validator
 from pydantic_core.core_schema import ValidationInfo
 
 from config import settings
-from llm import LLM
+from llm import LLM, get_shared_llm
 from base_tool import BaseTool, ToolResult
 from tools.search import SearchTool
 
@@ -49,6 +49,7 @@ Context = TypeVar("Context")
 
 class BrowserUseTool(BaseTool, Generic[Context]):
     name: str = "browser_use"
+    parallel_safe: bool = False
     description: str = "A tool to interact with websites using a real browser. Supports searching, clicking, and reading."
     instructions: str = """
 > [!IMPORTANT]
@@ -130,7 +131,7 @@ class BrowserUseTool(BaseTool, Generic[Context]):
     dom_service: Optional[DomService] = Field(default=None, exclude=True)
     web_search_tool: SearchTool = Field(default_factory=SearchTool, exclude=True)
     tool_context: Optional[Context] = Field(default=None, exclude=True)
-    llm: Optional[LLM] = Field(default_factory=LLM)
+    llm: Optional[LLM] = Field(default_factory=get_shared_llm)
 
     # State tracking
     last_action: str = ""
@@ -248,6 +249,8 @@ class BrowserUseTool(BaseTool, Generic[Context]):
                     if not query:
                         return ToolResult(error="Query is required for 'web_search' action")
                     search_response = await self.web_search_tool.execute(query=query)
+                    if isinstance(search_response, ToolResult):
+                        return search_response
                     return ToolResult(output=search_response)
 
                 # Handle get_state
@@ -6,6 +6,8 @@ from loguru import logger
 
 class CalculatorTool(BaseTool):
     name: str = "calculator"
+    cacheable: bool = True
+    parallel_safe: bool = True
     description: str = "Perform a mathematical calculation safely."
     parameters: dict = {
         "type": "object",
@@ -8,6 +8,7 @@ class EditorTool(BaseTool):
     Inspired by OpenManus StrReplaceEditor.
     """
     name: str = "editor"
+    parallel_safe: bool = False
     description: str = """Custom editing tool for viewing, creating and editing files.
     * Use 'view' to see file content with line numbers.
     * Use 'create' to make a new file.
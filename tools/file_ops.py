@@ -5,6 +5,7 @@ from loguru import logger
 
 class FileOpsTool(BaseTool):
     name: str = "file_ops"
+    parallel_safe: bool = False
     description: str = "Perform file operations: read, write, or list files. Supports absolute paths."
     parameters: dict = {
         "type": "object",
@@ -8,6 +8,7 @@ from loguru import logger
 
 class MemoryTool(BaseTool):
     name: str = "memory_tool"
+    parallel_safe: bool = False
     description: str = "Save or recall information from persistent memory across sessions."
     parameters: dict = {
         "type": "object",
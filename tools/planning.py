@@ -8,6 +8,7 @@ class PlanningTool(BaseTool):
     and feasibility validation for complex task sequences.
     """
     name: str = "planning"
+    parallel_safe: bool = False
     description: str = """Create and manage structured plans for complex tasks.
     Commands:
     - 'create': Start a new plan with steps. Supports auto-decomposition from a goal.
@@ -6,6 +6,7 @@ from loguru import logger
 
 class PythonREPLTool(BaseTool):
     name: str = "python_repl"
+    parallel_safe: bool = False
     description: str = "Execute Python code for calculations, data processing, or algorithms. Use this when math or logic is too complex for text."
     parameters: dict = {
         "type": "object",
@@ -1,10 +1,13 @@
 import httpx
 from bs4 import BeautifulSoup
-from base_tool import BaseTool
+from base_tool import BaseTool, ToolResult
 from loguru import logger
+from typing import Any
 
 class ScraperTool(BaseTool):
     name: str = "scraper"
+    cacheable: bool = True
+    parallel_safe: bool = True
     description: str = "Extract full text content from a given URL."
     parameters: dict = {
         "type": "object",
@@ -14,7 +17,7 @@ class ScraperTool(BaseTool):
         "required": ["url"]
     }
 
-    async def execute(self, url: str) -> str:
+    async def execute(self, url: str) -> Any:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
@@ -41,4 +44,4 @@ class ScraperTool(BaseTool):
                 
         except Exception as e:
             logger.error(f"Scraper error: {e}")
-            return f"Error scraping URL: {str(e)}"
+            return ToolResult(error=f"Failed to scrape URL: {str(e)}")
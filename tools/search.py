@@ -1,11 +1,31 @@
-from tavily import TavilyClient
 from config import settings
-from base_tool import BaseTool
+from base_tool import BaseTool, ToolResult
+from llm import get_http_client
 from loguru import logger
 import asyncio
+from typing import Any
+
+_RESULT_TEMPLATE = "Title: %s\nSource: %s\nSnippets: %s\n"
+
+# Tavily's REST API is called directly on the shared async connection pool, so concurrent
+# searches overlap on the event loop instead of queuing behind the blocking SDK client
+_TAVILY_URL = "https://api.tavily.com"
+_TAVILY_TIMEOUT = 30.0
+
+async def _tavily_search(query: str) -> dict:
+    response = await get_http_client(_TAVILY_URL).post(
+        f"{_TAVILY_URL}/search",
+        json={"query": query, "search_depth": "advanced"},
+        headers={"Authorization": f"Bearer {settings.TAVILY_API_KEY}"},
+        timeout=_TAVILY_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
 
 class SearchTool(BaseTool):
     name: str = "search_tool"
+    cacheable: bool = True
+    parallel_safe: bool = True
     description: str = "Search the web for simple queries, checking facts, or news. Use 'browser_use' for deep navigation."
     instructions: str = """
 1. **QUICK FACTS**: Use this tool for facts, dates, news, or finding URLs.
@@ -20,23 +40,22 @@ class SearchTool(BaseTool):
         "required": ["query"]
     }
 
-    async def execute(self, query: str = "", **kwargs) -> str:
+    async def execute(self, query: str = "", **kwargs) -> Any:
         # Resilient argument handling
         query = query or kwargs.get("text") or kwargs.get("input") or ""
         if not query:
-            return "Error: No search query provided."
-        
-        results = []
+            return ToolResult(error="No search query provided.")
         
         # 1. Try Tavily (Advanced)
         if settings.TAVILY_API_KEY:
             try:
-                client = TavilyClient(api_key=settings.TAVILY_API_KEY)
-                response = client.search(query=query, search_depth="advanced")
-                for result in response.get('results', []):
-                    results.append(f"Title: {result.get('title')}\nSource: {result.get('url')}\nSnippets: {result.get('content')}\n")
+                response = await _tavily_search(query)
+                results = "\n".join(
+                    _RESULT_TEMPLATE % (r.get('title'), r.get('url'), r.get('content'))
+                    for r in response.get('results', ())
+                )
                 if results:
-                    return "--- Tavily Results ---\n" + "\n".join(results)
+                    return "--- Tavily Results ---\n" + results
             except Exception as e:
                 logger.debug(f"Tavily failed: {e}")
 
@@ -44,24 +63,23 @@ class SearchTool(BaseTool):
         try:
             from duckduckgo_search import DDGS
             with DDGS() as ddgs:
-                ddg_results = ddgs.text(query, max_results=5)
-                for r in ddg_results:
-                    results.append(f"Title: {r.get('title')}\nSource: {r.get('href')}\nSnippets: {r.get('body')}\n")
+                results = "\n".join(
+                    _RESULT_TEMPLATE % (r.get('title'), r.get('href'), r.get('body'))
+                    for r in ddgs.text(query, max_results=5) or ()
+                )
                 if results:
-                    return "--- DuckDuckGo Results ---\n" + "\n".join(results)
+                    return "--- DuckDuckGo Results ---\n" + results
         except Exception as e:
             logger.debug(f"DuckDuckGo failed: {e}")
 
         # 3. Fallback to Google Search (Free)
         try:
             from googlesearch import search
-            google_results = []
-            for url in search(query, num_results=5):
-                google_results.append(f"URL: {url}")
-            
-            if google_results:
-                return "--- Google Results ---\n" + "\n".join(google_results)
+            results = "\n".join("URL: %s" % url for url in search(query, num_results=5))
+            if results:
+                return "--- Google Results ---\n" + results
         except Exception as e:
             logger.debug(f"Google failed: {e}")
 
-        return "Error: No results found after trying all search providers."
+        # Reported as an error so the tool cache doesn't replay a transient outage
+        return ToolResult(error="No results found after trying all search providers.")
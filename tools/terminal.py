@@ -1,12 +1,25 @@
 import asyncio
+import codecs
 import os
 import platform
-from typing import ClassVar, Dict
-from base_tool import BaseTool, ToolResult
+from typing import AsyncIterator, ClassVar, Dict
+from base_tool import BaseTool, ToolResult, collect_capped
 from event_bus import EventBus
 
+
+async def _iter_pipe(stream: asyncio.StreamReader, chunk_size: int = 4096) -> AsyncIterator[str]:
+    """Yield decoded text from a subprocess pipe without buffering it all."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = await stream.read(chunk_size)
+        if not data:
+            break
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
 class TerminalTool(BaseTool):
     name: str = "terminal"
+    parallel_safe: bool = False
     description: str = """Execute shell/terminal/CMD/PowerShell commands.
     CAPABILITIES: Run ANY command (python, pip, git, curl, powershell), install packages, and manage files.
     This is your fallback tool when others fail."""
@@ -73,26 +86,28 @@ class TerminalTool(BaseTool):
                 cwd=cwd
             )
             
+            # Pipes are drained into capped head/tail buffers, so verbose commands
+            # never hold more than ~3KB of stdout / ~1KB of stderr in memory.
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
+                output, error, _ = await asyncio.wait_for(
+                    asyncio.gather(
+                        collect_capped(_iter_pipe(process.stdout), head=2000, tail=1000),
+                        collect_capped(_iter_pipe(process.stderr), head=500, tail=500),
+                        process.wait(),
+                    ),
                     timeout=timeout
                 )
             except asyncio.TimeoutError:
                 process.kill()
                 return f"Timeout after {timeout}s."
             
-            output = stdout.decode(errors='replace').strip()
-            error = stderr.decode(errors='replace').strip()
+            output = output.strip()
+            error = error.strip()
             
             result = []
             if output:
-                if len(output) > 3000:
-                    output = output[:3000] + "\n... [TRUNCATED]"
                 result.append(output)
             if error:
-                if len(error) > 1000:
-                    error = error[:1000] + "\n... [TRUNCATED]"
                 result.append(f"STDERR: {error}")
             
             exit_code = process.returncode
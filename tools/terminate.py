@@ -2,6 +2,7 @@ from base_tool import BaseTool, ToolResult
 
 class Terminate(BaseTool):
     name: str = "terminate"
+    parallel_safe: bool = False
     description: str = "Use this tool to end the task and provide the final answer to the user."
     parameters: dict = {
         "type": "object",
@@ -1,11 +1,14 @@
-from base_tool import BaseTool
+from base_tool import BaseTool, ToolResult
 import os
-from openai import AsyncOpenAI
+from typing import Any, Dict
 from config import settings
+from llm import get_openai_client
 from loguru import logger
 
 class TranscriptionTool(BaseTool):
     name: str = "transcribe"
+    cacheable: bool = True
+    parallel_safe: bool = True
     description: str = """Transcribe an audio file (mp3, mp4, mpeg, mpga, m4a, wav, or webm) into text. 
     Use this to understand the content of audio files provided by the user."""
     
@@ -20,14 +23,21 @@ class TranscriptionTool(BaseTool):
         "required": ["file_path"]
     }
 
-    async def execute(self, file_path: str) -> str:
+    def cache_args(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        # A file rewritten at the same path must not get the old transcript
+        try:
+            stat = os.stat(args.get("file_path", ""))
+        except OSError:
+            return args
+        return {**args, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    async def execute(self, file_path: str) -> Any:
         if not os.path.exists(file_path):
-            return f"Error: File not found at {file_path}"
+            return ToolResult(error=f"File not found at {file_path}")
         
         try:
-            # Use a fresh client for transcription to ensure correct base_url/model
             # Most providers use the standard OpenAI whisper-1 model name
-            client = AsyncOpenAI(api_key=settings.API_KEY, base_url=settings.BASE_URL)
+            client = get_openai_client(settings.API_KEY, settings.BASE_URL)
             
             with open(file_path, "rb") as audio_file:
                 transcription = await client.audio.transcriptions.create(
@@ -39,4 +49,4 @@ class TranscriptionTool(BaseTool):
             
         except Exception as e:
             logger.error(f"Transcription error: {e}")
-            return f"Error transcribing file: {str(e)}"
+            return ToolResult(error=f"Failed to transcribe file: {str(e)}")